@@ -0,0 +1,335 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Local stand-in for the Cloud Foundry v2 and v3 APIs (and the UAA token endpoint) that is used by the benchmarks.
+# Serves generated organizations, spaces, services, service plans, service instances and service keys.
+
+from collections import Counter
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+
+def getResource(guid, **entity):
+    """
+    Return a Cloud Foundry v2 resource
+    """
+    return {'metadata': {'guid': guid,
+                         'url': None,
+                         'created_at': '2017-01-01T00:00:00Z',
+                         'updated_at': None},
+            'entity': entity}
+
+
+def getV3Resource(resource, name, **relationships):
+    """
+    Return the Cloud Foundry v3 representation of a v2 resource. Keyword arguments are to-one relationships.
+    """
+    v3_resource = {'guid': resource['metadata']['guid'],
+                   'name': name,
+                   'created_at': resource['metadata']['created_at'],
+                   'updated_at': resource['metadata']['updated_at'] or resource['metadata']['created_at'],
+                   'relationships': dict((key, {'data': {'guid': guid}}) for key, guid in relationships.items() if key != 'type')}
+    if 'type' in relationships:
+        v3_resource['type'] = relationships['type']
+    return v3_resource
+
+
+class MockData:
+    def __init__(self, organizations=10, spaces_per_organization=5, services=50, service_plans=150, service_instances=1000, service_keys=None):
+        """
+        Generates Cloud Foundry resources. By default every service instance has one service key.
+        """
+        if service_keys is None:
+            service_keys = service_instances
+
+        self.organizations = [getResource('org-{}'.format(i), name='organization {}'.format(i)) for i in range(organizations)]
+        self.spaces = [getResource('space-{}-{}'.format(i, j), name='space {}'.format(j), organization_guid='org-{}'.format(i))
+                       for i in range(organizations) for j in range(spaces_per_organization)]
+        self.services = [getResource('service-{}'.format(i), label='service{}'.format(i)) for i in range(services)]
+        self.service_plans = [getResource('plan-{}'.format(i), name='plan{}'.format(i % 4), service_guid='service-{}'.format(i % services))
+                              for i in range(service_plans)]
+        self.service_instances = [getResource('instance-{}'.format(i),
+                                              name='instance{:06d}'.format(i),
+                                              service_guid='service-{}'.format(i % service_plans % services),
+                                              service_plan_guid='plan-{}'.format(i % service_plans),
+                                              space_guid=self.spaces[i % len(self.spaces)]['metadata']['guid'])
+                                  for i in range(service_instances)]
+        self.service_keys = [getResource('key-{}'.format(i),
+                                         name='credentials-{}'.format(i),
+                                         service_instance_guid='instance-{}'.format(i % max(1, service_instances)),
+                                         credentials={'username': 'user{}'.format(i), 'password': 'secret'})
+                             for i in range(service_keys)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, body, status=200):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        """
+        UAA token endpoint (password and refresh_token grants). If passwords are configured (see MockServer),
+        password grants for those users are only accepted with the right password.
+        """
+        self.server.record(urlparse(self.path).path)
+        form = parse_qs(self.rfile.read(int(self.headers.get('content-length', 0))).decode('utf-8'))
+        grant_type = form.get('grant_type', [None])[0]
+        with self.server.lock:
+            self.server.grants[grant_type] += 1
+        if grant_type == 'password':
+            username = form.get('username', [None])[0]
+            if username in self.server.passwords and form.get('password', [None])[0] != self.server.passwords[username]:
+                return self.send({'error': 'unauthorized', 'error_description': 'Bad credentials'}, status=401)
+        self.send({'token_type': 'bearer',
+                   'access_token': 'access-token',
+                   'refresh_token': 'refresh-token',
+                   'expires_in': self.server.token_lifetime})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+        self.server.record(path)
+
+        data = self.server.data
+        if path == '/info':
+            return self.send({'authorization_endpoint': 'http://{}:{}'.format(*self.server.server_address[:2])})
+        if path.startswith('/v3/'):
+            return self.sendV3Page(path, query)
+
+        listings = {'/v2/organizations': data.organizations,
+                    '/v2/spaces': data.spaces,
+                    '/v2/services': data.services,
+                    '/v2/service_plans': data.service_plans,
+                    '/v2/service_instances': data.service_instances,
+                    '/v2/service_keys': data.service_keys}
+        resources = listings.get(path)
+        if resources is None:
+            match = re.match(r'^/v2/(organizations|spaces|services|service_plans|service_instances)/([^/]+)$', path)
+            if match:
+                resource = [resource for resource in listings['/v2/' + match.group(1)] if resource['metadata']['guid'] == match.group(2)]
+                if not resource:
+                    return self.send({'description': 'Not found', 'error_code': 'CF-NotFound'}, status=404)
+                return self.send(resource[0])
+            match = re.match(r'^/v2/organizations/([^/]+)/spaces$', path)
+            if match:
+                resources = [space for space in data.spaces if space['entity']['organization_guid'] == match.group(1)]
+            match = re.match(r'^/v2/spaces/([^/]+)/service_instances$', path)
+            if match:
+                resources = [instance for instance in data.service_instances if instance['entity']['space_guid'] == match.group(1)]
+            match = re.match(r'^/v2/service_instances/([^/]+)/service_keys$', path)
+            if match:
+                resources = [key for key in data.service_keys if key['entity']['service_instance_guid'] == match.group(1)]
+        if resources is None:
+            return self.send({'description': 'Unknown request', 'error_code': 'CF-NotFound'}, status=404)
+
+        # q=created_at>timestamp, q=name:value, q=name IN value,value
+        for q in query.get('q', []):
+            if '>' in q:
+                name, value = q.split('>', 1)
+                resources = [resource for resource in resources if (resource['metadata'].get(name) or '') > value]
+            else:
+                name, values = q.split(' IN ', 1) if ' IN ' in q else q.split(':', 1)
+                resources = [resource for resource in resources if self.getProperty(resource, name) in values.split(',')]
+
+        per_page = min(int(query.get('results-per-page', ['50'])[0]), self.server.max_page_size)
+        page = int(query.get('page', ['1'])[0])
+        total_pages = max(1, (len(resources) + per_page - 1) // per_page)
+        next_url = None
+        if page < total_pages:
+            next_url = '{}?{}results-per-page={}&page={}'.format(path, ''.join('q={}&'.format(q) for q in query.get('q', [])), per_page, page + 1)
+        self.send({'total_results': len(resources),
+                   'total_pages': total_pages,
+                   'prev_url': None,
+                   'next_url': next_url,
+                   'resources': resources[(page - 1) * per_page:page * per_page]})
+
+
+    def getProperty(self, resource, name):
+        """
+        Return a property of a v2 resource (organization_guid of a service instance: the organization of its space)
+        """
+        if name == 'guid':
+            return resource['metadata']['guid']
+        if name == 'organization_guid' and 'space_guid' in resource['entity']:
+            spaces = [space for space in self.server.data.spaces if space['metadata']['guid'] == resource['entity']['space_guid']]
+            return spaces[0]['entity']['organization_guid'] if spaces else None
+        return resource['entity'].get(name)
+
+    def sendV3Page(self, path, query):
+        """
+        Cloud Foundry v3 listings (service offerings, service plans and service instances with included spaces and organizations)
+        """
+        data = self.server.data
+        if path == '/v3/organizations':
+            resources = [getV3Resource(resource, name=resource['entity']['name']) for resource in data.organizations]
+        elif path == '/v3/spaces':
+            resources = [getV3Resource(resource, name=resource['entity']['name'], organization=resource['entity']['organization_guid'])
+                         for resource in data.spaces]
+        elif path == '/v3/service_offerings':
+            resources = [getV3Resource(resource, name=resource['entity']['label']) for resource in data.services]
+        elif path == '/v3/service_plans':
+            resources = [getV3Resource(resource, name=resource['entity']['name'], service_offering=resource['entity']['service_guid'])
+                         for resource in data.service_plans]
+        elif path == '/v3/service_instances':
+            resources = [getV3Resource(resource,
+                                       name=resource['entity']['name'],
+                                       type='managed',
+                                       space=resource['entity']['space_guid'],
+                                       service_plan=resource['entity']['service_plan_guid'])
+                         for resource in data.service_instances]
+        else:
+            return self.send({'errors': [{'detail': 'Unknown request', 'title': 'CF-ResourceNotFound', 'code': 10010}]}, status=404)
+
+        # guids, names, organization_guids, space_guids and service_plan_guids filters
+        spaces = dict((space['metadata']['guid'], space['entity']['organization_guid']) for space in data.spaces)
+        for name, values in query.items():
+            values = values[0].split(',')
+            if name == 'guids':
+                resources = [resource for resource in resources if resource['guid'] in values]
+            elif name == 'names':
+                resources = [resource for resource in resources if resource['name'] in values]
+            elif name == 'organization_guids':
+                resources = [resource for resource in resources
+                             if resource['relationships'].get('organization', {}).get('data', {}).get('guid') in values
+                             or spaces.get(resource['relationships'].get('space', {}).get('data', {}).get('guid')) in values]
+            elif name in ['space_guids', 'service_plan_guids']:
+                resources = [resource for resource in resources if resource['relationships'][name[:-6]]['data']['guid'] in values]
+        total_results = len(resources)
+
+        per_page = min(int(query.get('per_page', ['50'])[0]), 5000)
+        page = int(query.get('page', ['1'])[0])
+        total_pages = max(1, (len(resources) + per_page - 1) // per_page)
+        resources = resources[(page - 1) * per_page:page * per_page]
+        body = {'pagination': {'total_results': total_results,
+                               'total_pages': total_pages,
+                               'next': None},
+                'resources': resources}
+        if page < total_pages:
+            parameters = ''.join('{}={}&'.format(name, values[0]) for name, values in query.items() if name not in ['per_page', 'page'])
+            body['pagination']['next'] = {'href': 'http://{}:{}{}?{}per_page={}&page={}'.format(self.server.server_address[0],
+                                                                                             self.server.server_address[1],
+                                                                                             path, parameters, per_page, page + 1)}
+        if path == '/v3/service_instances' and any(name.startswith('fields[space') for name in query):
+            spaces = dict((space['metadata']['guid'], space) for space in data.spaces)
+            organizations = dict((org['metadata']['guid'], org) for org in data.organizations)
+            space_guids = sorted(set(resource['relationships']['space']['data']['guid'] for resource in resources))
+            org_guids = sorted(set(spaces[guid]['entity']['organization_guid'] for guid in space_guids))
+            body['included'] = {'spaces': [getV3Resource(spaces[guid], name=spaces[guid]['entity']['name'],
+                                                         organization=spaces[guid]['entity']['organization_guid'])
+                                           for guid in space_guids],
+                                'organizations': [getV3Resource(organizations[guid], name=organizations[guid]['entity']['name'])
+                                                  for guid in org_guids]}
+        self.send(body)
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, data=None, latency=0.0, max_page_size=100, port=0, passwords=None, token_lifetime=1200):
+        """
+        Mock Cloud Foundry API server that listens on localhost. Every request is delayed by latency
+        seconds. Pages contain at most max_page_size resources (the Cloud Foundry v2 API limit is 100).
+        passwords is a dictionary of IBMids and their passwords (other users can log in with any password).
+        Access tokens expire after token_lifetime seconds.
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', port), MockHandler)
+        self.data = data or MockData()
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.passwords = passwords or {}
+        self.token_lifetime = token_lifetime
+        self.requests = Counter()
+        self.grants = Counter()     # token requests by grant type
+        self.lock = threading.Lock()
+
+    @property
+    def api_base_url(self):
+        """
+        API base URL template, as expected by the Client and the Collector
+        """
+        return 'http://{}:{}'.format(*self.server_address[:2]) + '{}'
+
+    def record(self, path):
+        """
+        Count the request (by URL template) and simulate network latency
+        """
+        path = re.sub(r'/v2/(\w+)/[^/]+/', r'/v2/\1/:guid/', path)
+        with self.lock:
+            self.requests[path] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def resetCounters(self):
+        with self.lock:
+            self.requests.clear()
+            self.grants.clear()
+
+    def getRequestCount(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        """
+        Serve requests in a background thread. Returns the server.
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Mock Cloud Foundry API server')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--service-instances', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--max-page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    server = MockServer(MockData(service_instances=args.service_instances),
+                        latency=args.latency,
+                        max_page_size=args.max_page_size,
+                        port=args.port)
+    print('Serving the mock Cloud Foundry API at {}'.format(server.api_base_url.format('')))
+    server.serve_forever()
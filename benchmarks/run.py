@@ -0,0 +1,236 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Benchmarks the Collector and the Visualizer routes against a local mock Cloud Foundry API:
+#  $ python benchmarks/run.py                       # all scenarios
+#  $ python benchmarks/run.py collect --latency 0.05 --service-instances 5000
+#  $ python benchmarks/run.py visualizer --sizes 1000 10000
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.collector import Collector
+from cfservices.filters import FilterIndex, ServiceInstanceFilter
+
+from mockcf import MockData, MockServer
+
+
+def measure(function):
+    """
+    Invoke function and return its result, the wall time in seconds and the peak memory allocated in bytes
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    try:
+        result = function()
+        elapsed = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc is not None else None
+    finally:
+        if tracemalloc is not None:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(scenario, **results):
+    """
+    Print the results of a scenario (one JSON document per line)
+    """
+    results['scenario'] = scenario
+    print(json.dumps(results, sort_keys=True))
+
+
+def getCollector(server, collector_class=Collector, **kwargs):
+    collector = collector_class(ibm_cloud_user_api_token='benchmark',
+                                api_base_url=server.api_base_url,
+                                **kwargs)
+    collector.verbose = False
+    return collector
+
+
+def benchmarkCollect(args):
+    """
+    Full and incremental collection at different concurrency levels
+    """
+    server = MockServer(MockData(service_instances=args.service_instances),
+                        latency=args.latency,
+                        max_page_size=args.max_page_size).start()
+
+    collector_classes = [('Collector', Collector)]
+    try:
+        from cfservices.aiocollector import AsyncCollector
+        collector_classes.append(('AsyncCollector', AsyncCollector))
+    except ImportError:
+        pass
+
+    try:
+        for name, collector_class in collector_classes:
+            for api_version, max_concurrency in [(api_version, max_concurrency) for api_version in args.api_versions for max_concurrency in args.concurrency]:
+                if api_version != 2 and name != 'Collector':
+                    continue
+                collector = getCollector(server, collector_class, max_concurrency=max_concurrency, api_version=api_version)
+
+                server.resetCounters()
+                collector.metrics.reset()
+                df, elapsed, peak = measure(collector.collect)
+                report('collect',
+                       collector=name,
+                       api_version=api_version,
+                       max_concurrency=max_concurrency,
+                       latency=args.latency,
+                       service_instances=len(df),
+                       seconds=round(elapsed, 3),
+                       requests=server.getRequestCount(),
+                       peak_memory=peak,
+                       phases=dict((phase['phase'], round(phase['duration'], 3)) for phase in collector.metrics.getSummary()['phases']))
+
+                if name == 'Collector':
+                    cfdata = dict(collector.cfdata)
+                    server.resetCounters()
+                    df, elapsed, peak = measure(lambda: collector.collectChanges(cfdata, df, collector.high_water_mark))
+                    report('collect_changes',
+                           collector=name,
+                           api_version=api_version,
+                           max_concurrency=max_concurrency,
+                           latency=args.latency,
+                           service_instances=len(df),
+                           seconds=round(elapsed, 3),
+                           requests=server.getRequestCount(),
+                           peak_memory=peak)
+    finally:
+        server.stop()
+
+
+def getServiceInstanceDataFrame(service_instances):
+    """
+    Generate a service instance DataFrame (as returned by Collector.collect) without crawling the mock API
+    """
+    data = MockData(organizations=max(10, service_instances // 500),
+                    service_instances=service_instances,
+                    service_keys=0)
+    # the lookup maps are populated directly; the client is not used
+    collector = Collector(client=object())
+    collector.verbose = False
+    for resource in data.organizations:
+        collector.addOrganization(resource)
+    for resource in data.spaces:
+        collector.addSpace(resource)
+    for resource in data.services:
+        collector.addService(resource)
+    for resource in data.service_plans:
+        collector.addServicePlan(resource)
+    return collector.getDataFrame([collector.getServiceInstance(resource) for resource in data.service_instances])
+
+
+def timeit(function, repeat):
+    """
+    Return the best wall time in milliseconds of repeat invocations of function
+    """
+    timings = []
+    for i in range(repeat):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    return round(min(timings) * 1000, 3)
+
+
+def benchmarkVisualizer(args):
+    """
+    Setup and display_filters / display_service_list timings for different numbers of service instances.
+    The routes are invoked directly if pixiedust is installed; otherwise the index lookups they perform are timed.
+    """
+    try:
+        from cfservices.visualizer import Visualizer
+    except ImportError:
+        Visualizer = None
+
+    for size in args.sizes:
+        df = getServiceInstanceDataFrame(size)
+        service_guid = df['service_guid'].iloc[0]
+        org_guid = df['org_guid'].iloc[0]
+        selections = [('all', {}),
+                      ('service', {'service_guid': service_guid}),
+                      ('service_org', {'service_guid': service_guid, 'org_guid': org_guid})]
+
+        if Visualizer is not None:
+            app = Visualizer()
+            app.pixieapp_entity = {'data': df, 'client': object(), 'credentials_ttl': 300}
+            _, elapsed, peak = measure(app.setup)
+            report('visualizer_setup', service_instances=size, milliseconds=round(elapsed * 1000, 3), peak_memory=peak)
+            for name, selection in selections:
+                app.state['filter'].update(dict({'service_guid': None, 'service_plan_name': None, 'org_guid': None, 'space_guid': None}, **selection))
+                report('display_filters', service_instances=size, selection=name,
+                       milliseconds=timeit(app.display_filters, args.repeat))
+                # the first invocation computes the result, subsequent ones are served from the cache
+                app.service_filter.cache.clear()
+                report('display_service_list', service_instances=size, selection=name,
+                       milliseconds=timeit(app.display_service_list, 1))
+        else:
+            def setup():
+                return FilterIndex(df), ServiceInstanceFilter(df)
+            (filter_index, service_filter), elapsed, peak = measure(setup)
+            report('visualizer_setup', service_instances=size, milliseconds=round(elapsed * 1000, 3), peak_memory=peak, routes=False)
+            for name, selection in selections:
+                def display_filters():
+                    filter_index.getServiceOptions()
+                    filter_index.getServicePlanOptions(selection.get('service_guid'))
+                    filter_index.getOrgOptions(selection.get('service_guid'), None)
+                    filter_index.getSpaceOptions(selection.get('service_guid'), None, selection.get('org_guid'))
+
+                def display_service_list():
+                    service_filter.cache.clear()
+                    service_filter.getMatches(**selection).iloc[0:100].to_dict('records')
+
+                report('display_filters', service_instances=size, selection=name, routes=False,
+                       milliseconds=timeit(display_filters, args.repeat))
+                report('display_service_list', service_instances=size, selection=name, routes=False,
+                       milliseconds=timeit(display_service_list, args.repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='cfservices benchmarks')
+    parser.add_argument('scenarios', nargs='*', help='collect and/or visualizer (default: all scenarios)')
+    parser.add_argument('--service-instances', type=int, default=1000, help='collect: number of service instances')
+    parser.add_argument('--latency', type=float, default=0.01, help='collect: seconds per request')
+    parser.add_argument('--max-page-size', type=int, default=100, help='collect: resources per page')
+    parser.add_argument('--api-versions', type=int, nargs='+', default=[2], help='collect: Cloud Foundry API versions (2 and/or 3)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='collect: max_concurrency values')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='visualizer: numbers of service instances')
+    parser.add_argument('--repeat', type=int, default=5, help='visualizer: repetitions per timing')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios or ['collect', 'visualizer']
+    for scenario in scenarios:
+        if scenario not in ['collect', 'visualizer']:
+            parser.error('invalid scenario "{}"'.format(scenario))
+
+    if 'collect' in scenarios:
+        benchmarkCollect(args)
+    if 'visualizer' in scenarios:
+        benchmarkVisualizer(args)
@@ -0,0 +1,277 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Collector tests against the mock Cloud Foundry API (run with: python -m pytest benchmarks)
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.collector import Collector
+from cfservices.policy import RequestPolicy
+from cfservices.refresh import InventoryRefresher
+
+from mockcf import MockData, MockHandler, MockServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockServer(MockData(organizations=10, spaces_per_organization=5, service_instances=1000)).start()
+    yield server
+    server.stop()
+
+
+def getCollector(server, **kwargs):
+    collector = Collector(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url, **kwargs)
+    collector.verbose = False
+    return collector
+
+
+def getRows(df):
+    return df.sort_values('service_instance_guid').to_dict('records')
+
+
+def test_fetch_pages_in_order(server, monkeypatch):
+    # later pages are answered first
+    do_GET = MockHandler.do_GET
+
+    def delayed_GET(handler):
+        if handler.path.startswith('/v2/service_instances?') and '&page=' in handler.path:
+            time.sleep(0.02 * (12 - int(handler.path.split('&page=')[1].split('&')[0])))
+        do_GET(handler)
+
+    monkeypatch.setattr(MockHandler, 'do_GET', delayed_GET)
+    collector = getCollector(server, max_concurrency=8)
+    pages = list(collector.fetchPages('/v2/service_instances?results-per-page=100', 'service instance information'))
+
+    assert len(pages) == 10
+    assert [resource['metadata']['guid'] for page in pages for resource in page['resources']] == \
+           [resource['metadata']['guid'] for resource in server.data.service_instances]
+
+
+def test_retry_after_on_429(server, monkeypatch):
+    # the first request for the second page of the service instance listing is rate limited
+    do_GET = MockHandler.do_GET
+    throttled = []
+    lock = threading.Lock()
+
+    def throttling_GET(handler):
+        if handler.path.startswith('/v2/service_instances?') and '&page=2' in handler.path:
+            with lock:
+                throttle = not throttled
+                throttled.append(handler.path)
+            if throttle:
+                handler.send_response(429)
+                handler.send_header('retry-after', '0.3')
+                handler.send_header('content-length', '0')
+                handler.end_headers()
+                return
+        do_GET(handler)
+
+    monkeypatch.setattr(MockHandler, 'do_GET', throttling_GET)
+    policy = RequestPolicy(max_concurrency=8)
+    collector = getCollector(server, max_concurrency=8, policy=policy)
+    limits = []
+    collector.metrics.addCallback(lambda event: limits.append(policy.limiter.getLimit()))
+
+    start = time.time()
+    df = collector.collect()
+
+    assert len(df) == 1000
+    assert len(throttled) == 2
+    assert time.time() - start >= 0.3
+    assert min(limits) < 8
+    stats = [stats for stats in collector.metrics.getSummary()['by_url_template'] if stats['url_template'] == '/v2/service_instances'][0]
+    # only the final status is recorded, the 429 response is counted as a retry
+    assert stats['retries'] == 1
+    assert stats['statuses'] == {200: stats['count']}
+
+
+def test_retry_after_delay():
+    class Response:
+        def __init__(self, retry_after):
+            self.headers = {'retry-after': retry_after}
+
+    policy = RequestPolicy(max_retries=2, max_retry_after=10)
+    assert policy.getDelay(0, Response('3')) == 3
+    assert policy.getDelay(0, Response('600')) == 10
+    assert 0 <= policy.getDelay(1, Response(None)) <= 1
+    assert policy.isRetryable('GET', 0, 429)
+    assert not policy.isRetryable('GET', 2, 429)
+    assert not policy.isRetryable('POST', 0, 503)
+    assert not policy.isRetryable('GET', 0, 404)
+
+
+def test_collect_changes():
+    data = MockData(organizations=5, spaces_per_organization=4, service_instances=500)
+    server = MockServer(data).start()
+    try:
+        collector = getCollector(server)
+        df = collector.collect()
+        cfdata = dict(collector.cfdata)
+        since = collector.high_water_mark
+
+        # rename an organization and a service instance, create a service instance
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        data.organizations[1]['entity']['name'] = 'renamed organization'
+        data.organizations[1]['metadata']['updated_at'] = now
+        data.service_instances[7]['entity']['name'] = 'renamed instance'
+        data.service_instances[7]['metadata']['updated_at'] = now
+        created = dict(data.service_instances[8], metadata=dict(data.service_instances[8]['metadata'], guid='instance-new', created_at=now))
+        data.service_instances.append(created)
+
+        server.resetCounters()
+        changed = collector.collectChanges(cfdata, df, since)
+        # no listing was reloaded in full
+        assert all('page' not in path for path in server.requests)
+        assert server.requests['/v2/service_instances'] == 3
+        assert len(changed) == 501
+        assert getRows(changed) == getRows(getCollector(server).collect())
+        row = changed[changed.service_instance_guid == 'instance-7'].iloc[0]
+        assert row['service_instance_name'] == 'renamed instance'
+        assert set(changed[changed.org_guid == 'org-1'].org_name) == set(['renamed organization'])
+
+        # a deleted service instance is detected by its count and the listing is reconciled
+        cfdata = dict(collector.cfdata)
+        del data.service_instances[0]
+        changed = collector.collectChanges(cfdata, changed, since)
+        assert len(changed) == 500
+        assert 'instance-0' not in set(changed.service_instance_guid)
+        assert getRows(changed) == getRows(getCollector(server).collect())
+    finally:
+        server.stop()
+
+
+def test_filtered_urls(server):
+    collector = getCollector(server)
+    collector.MAX_FILTER_VALUES = 2
+
+    assert collector.getFilteredURLs('/v2/spaces?results-per-page=100', [('organization_guid', ['b', 'a', 'c', 'a'])]) == \
+           ['/v2/spaces?results-per-page=100&q=organization_guid%20IN%20a,b',
+            '/v2/spaces?results-per-page=100&q=organization_guid%20IN%20c']
+    assert collector.getFilteredURLs('/v2/service_instances', [('space_guid', ['s']), ('service_guid', ['x', 'y', 'z'])]) == \
+           ['/v2/service_instances?q=space_guid%20IN%20s&q=service_guid%20IN%20x,y',
+            '/v2/service_instances?q=space_guid%20IN%20s&q=service_guid%20IN%20z']
+    assert collector.getFilteredURLs('/v3/spaces?per_page=5000', [('names', ['space 1', 'a,b'])]) == \
+           ['/v3/spaces?per_page=5000&names=a%2Cb,space%201']
+    assert collector.getFilteredURLs('/v2/spaces', [('organization_guid', [])]) == []
+
+
+@pytest.mark.parametrize('api_version', [2, 3])
+@pytest.mark.parametrize('scope, expected', [
+    (dict(orgs='organization 3'), lambda df: df.org_name == 'organization 3'),
+    (dict(orgs='organization 1', spaces='space 2'), lambda df: (df.org_name == 'organization 1') & (df.space_name == 'space 2')),
+    (dict(services=['service7', 'service9']), lambda df: df.service_name.isin(['service7', 'service9'])),
+    (dict(orgs='organization 1', services='service7'), lambda df: (df.org_name == 'organization 1') & (df.service_name == 'service7')),
+    (dict(orgs='no such organization'), lambda df: df.org_name == 'no such organization')
+])
+def test_scoped_collection(server, api_version, scope, expected):
+    full = getCollector(server).collect()
+    df = getCollector(server, api_version=api_version, **scope).collect()
+
+    assert list(df.columns) == list(full.columns)
+    assert getRows(df) == getRows(full[expected(full)])
+
+
+def test_collect_changes_fallback(server, monkeypatch):
+    # the foundation does not support timestamp filters
+    do_GET = MockHandler.do_GET
+
+    def rejecting_GET(handler):
+        if 'q=created_at%3E' in handler.path or 'q=created_at>' in handler.path:
+            return handler.send({'description': 'The query parameter is invalid', 'error_code': 'CF-BadQueryParameter'}, status=400)
+        do_GET(handler)
+
+    collector = getCollector(server)
+    df = collector.collect()
+    monkeypatch.setattr(MockHandler, 'do_GET', rejecting_GET)
+
+    changed = collector.collectChanges(dict(collector.cfdata), df, collector.high_water_mark)
+    assert getRows(changed) == getRows(df)
+
+    refresher = InventoryRefresher(collector, df, cfdata=dict(collector.cfdata), high_water_mark=collector.high_water_mark)
+    refresher.collect()
+    assert refresher.error is None
+    assert getRows(refresher.getUpdate()['data']) == getRows(df)
+
+
+@pytest.mark.parametrize('options', [dict(), dict(api_version=3), dict(incremental_decoding=True), dict(catalogs='shared')])
+def test_async_collector(server, options):
+    aiocollector = pytest.importorskip('cfservices.aiocollector')
+    expected = getCollector(server).collect()
+    if options.get('catalogs') == 'shared':
+        options = dict(options, catalogs=getCollector(server).loadCatalogs())
+
+    collector = aiocollector.AsyncCollector(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url, **options)
+    collector.verbose = False
+    server.resetCounters()
+    df = collector.collect()
+
+    assert getRows(df) == getRows(expected)
+    if options.get('api_version') == 3:
+        assert server.requests['/v3/service_instances'] == 1
+        assert all(path.startswith('/v3/') for path in server.requests)
+    if options.get('catalogs') is not None:
+        assert '/v2/services' not in server.requests
+        assert '/v2/service_plans' not in server.requests
+
+
+def test_refresher(server, monkeypatch, capsys):
+    collector = getCollector(server)
+    df = collector.collect()
+    refresher = InventoryRefresher(collector, df, cfdata=dict(collector.cfdata), high_water_mark=collector.high_water_mark, interval=0.05)
+    refresher.start()
+    for attempt in range(100):
+        update = refresher.getUpdate()
+        if update is not None:
+            break
+        time.sleep(0.05)
+    assert getRows(update['data']) == getRows(df)
+
+    # errors are kept for the app rather than printed from the worker thread
+    monkeypatch.setattr(collector, 'collectChanges', lambda cfdata, data, since: 1 / 0)
+    refresher.collect()
+    assert 'division' in refresher.error
+    assert capsys.readouterr().out == ''
+
+    # running the app again stops the worker thread of the previous refresher for the same endpoint and user
+    thread = refresher.thread
+    other = InventoryRefresher(collector, df)
+    other.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    other.stop()
+    other.thread.join(timeout=5)
+    assert not other.thread.is_alive()
+
+
+def test_collect_columns(server):
+    columns = getCollector(server).collectColumns()
+    df = getCollector(server).collect()
+
+    assert list(columns.keys()) == Collector.SERVICE_INSTANCE_COLUMNS
+    assert columns == df[Collector.SERVICE_INSTANCE_COLUMNS].to_dict('list')
+
+    # the Collector core does not import pandas
+    code = 'import sys; import cfservices.collector; print("pandas" in sys.modules)'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert output.strip() == b'False'
@@ -0,0 +1,89 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Service key cache tests against the mock Cloud Foundry API (run with: python -m pytest benchmarks)
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.client import Client
+from cfservices.credentials import CredentialsCache
+
+from mockcf import MockData, MockServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockServer(MockData(service_instances=1000, service_keys=1500)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(server):
+    cache = CredentialsCache(Client(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url))
+    server.resetCounters()
+    return cache
+
+
+def test_get(server, cache):
+    service_keys = cache.get('instance-3')
+    assert [service_key['name'] for service_key in service_keys] == ['credentials-3', 'credentials-1003']
+    assert service_keys[0]['credentials'] == {'username': 'user3', 'password': 'secret'}
+
+    assert cache.get('instance-3') == service_keys
+    assert server.requests == {'/v2/service_instances/:guid/service_keys': 1}
+
+    cache.invalidate('instance-3')
+    cache.get('instance-3')
+    assert server.requests == {'/v2/service_instances/:guid/service_keys': 2}
+
+
+def test_prefetch_small_selections(server, cache):
+    for guid in ['instance-1', 'instance-2', 'instance-999']:
+        assert cache.prefetch([guid], background=False)
+    # one filtered request per selection, rather than the whole listing
+    assert server.requests == {'/v2/service_keys': 3}
+
+    assert [service_key['name'] for service_key in cache.get('instance-999')] == ['credentials-999']
+    assert server.requests == {'/v2/service_keys': 3}
+
+
+def test_prefetch_large_selection(server, cache):
+    guids = ['instance-{}'.format(i) for i in range(cache.MAX_FILTERED_GUIDS + 1)]
+    assert cache.prefetch(guids, background=True)
+    cache.prefetch_thread.join()
+
+    # the global listing is retrieved once and all service keys in it are cached
+    assert server.requests == {'/v2/service_keys': 15}
+    assert [service_key['name'] for service_key in cache.get('instance-0')] == ['credentials-0', 'credentials-1000']
+    assert [service_key['name'] for service_key in cache.get('instance-900')] == ['credentials-900']
+    assert cache.prefetch(guids + ['instance-901'], background=False)
+    assert server.requests == {'/v2/service_keys': 15}
+
+
+def test_prefetch_error(server, cache, monkeypatch, capsys):
+    monkeypatch.setattr(cache.collector, 'iterPages', lambda urls, description: iter([{'resources': [{}]}]))
+    cache.prefetch(['instance-1'], background=False)
+
+    # the error is kept for the app rather than printed from the worker thread
+    assert cache.prefetch_error is not None
+    assert capsys.readouterr().out == ''
+    assert not cache.isCached('instance-1')
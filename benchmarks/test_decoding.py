@@ -0,0 +1,84 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Response decoding tests against pages of the mock Cloud Foundry API (run with: python -m pytest benchmarks)
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices import decoding
+from cfservices.collector import Collector
+
+from mockcf import MockData
+
+FIELDS = Collector.SERVICE_INSTANCE_FIELDS
+
+
+@pytest.fixture(scope='module')
+def content():
+    resources = MockData(service_instances=20).service_instances
+    resources[3]['entity']['name'] = u'café instance'
+    resources[4]['entity']['parameters'] = {'nested': [1, {'name': 'ignored'}]}
+    page = {'total_results': 20, 'total_pages': 1, 'prev_url': None, 'next_url': None, 'resources': resources}
+    return json.dumps(page).encode('utf-8')
+
+
+def getExpected(content):
+    page = json.loads(content.decode('utf-8'))
+    page['resources'] = [dict((part, dict((name, resource[part].get(name)) for name in FIELDS[part])) for part in ['metadata', 'entity'])
+                         for resource in page['resources']]
+    return page
+
+
+def test_loads(content, monkeypatch):
+    expected = json.loads(content.decode('utf-8'))
+    assert decoding.loads(content) == expected
+    assert decoding.loads(content.decode('utf-8')) == expected
+
+    # standard library fallback
+    monkeypatch.setattr(decoding, 'orjson', None)
+    monkeypatch.setattr(decoding, 'ujson', None, raising=False)
+    assert decoding.loads(content) == expected
+
+
+def test_decode_page(content):
+    assert decoding.decodePage(content) == json.loads(content.decode('utf-8'))
+
+
+def test_decode_page_fields_without_ijson(content, monkeypatch):
+    monkeypatch.setattr(decoding, 'ijson', None)
+    assert decoding.decodePage(content, FIELDS) == getExpected(content)
+
+
+def test_decode_page_fields_with_ijson(content):
+    pytest.importorskip('ijson')
+    assert decoding.ijson is not None
+    assert decoding.decodePage(content, FIELDS) == getExpected(content)
+    page = decoding.decodePage(content, FIELDS)
+    assert page['resources'][3]['entity']['name'] == u'café instance'
+    assert page['total_pages'] == 1
+    assert 'parameters' not in page['resources'][4]['entity']
+
+
+def test_decode_empty_page():
+    content = json.dumps({'total_results': 0, 'total_pages': 1, 'prev_url': None, 'next_url': None, 'resources': []}).encode('utf-8')
+    for fields in [None, FIELDS]:
+        assert decoding.decodePage(content, fields)['resources'] == []
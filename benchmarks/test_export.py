@@ -0,0 +1,120 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Export writer and command line tests against the mock Cloud Foundry API (run with: python -m pytest benchmarks)
+
+import csv
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.cli import main
+from cfservices.collector import Collector
+from cfservices.export import export, getFormat
+
+from mockcf import MockData, MockServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockServer(MockData(organizations=4, spaces_per_organization=3, service_instances=250)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='module')
+def expected(server):
+    collector = getCollector(server)
+    return sorted(collector.collectRecords(), key=lambda row: row['service_instance_guid'])
+
+
+def getCollector(server):
+    collector = Collector(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url)
+    collector.verbose = False
+    return collector
+
+
+def getRows(rows):
+    return sorted([dict((column, row[column]) for column in Collector.SERVICE_INSTANCE_COLUMNS) for row in rows],
+                  key=lambda row: row['service_instance_guid'])
+
+
+def test_get_format():
+    assert getFormat('inventory.JSONL') == 'jsonl'
+    assert getFormat('inventory.feather') == 'arrow'
+    with pytest.raises(Exception):
+        getFormat('inventory.xlsx')
+
+
+@pytest.mark.parametrize('extension', ['.jsonl', '.parquet', '.arrow'])
+def test_export(server, expected, tmpdir, extension):
+    if extension != '.jsonl':
+        pytest.importorskip('pyarrow')
+    path = str(tmpdir.join('inventory' + extension))
+
+    assert export(getCollector(server), path, batch_size=100) == 250
+
+    if extension == '.jsonl':
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+    else:
+        import pyarrow.feather
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path) if extension == '.parquet' else pyarrow.feather.read_table(path)
+        rows = table.to_pylist()
+    assert getRows(rows) == expected
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'json', 'jsonl'])
+def test_cli(server, expected, tmpdir, monkeypatch, capsys, output_format):
+    monkeypatch.setenv('IBM_CLOUD_API_KEY', 'apikey')
+    path = str(tmpdir.join('inventory.' + output_format))
+
+    assert main(['--api-endpoint', server.api_base_url, '--format', output_format, '--output', path]) == 0
+
+    with open(path) as f:
+        if output_format == 'csv':
+            rows = [dict((column, value or None) for column, value in row.items()) for row in csv.DictReader(f)]
+        elif output_format == 'json':
+            rows = json.load(f)
+        else:
+            rows = [json.loads(line) for line in f]
+    assert getRows(rows) == expected
+    # progress information goes to stderr
+    assert 'Exported 250 service instances.' in capsys.readouterr().err
+
+
+def test_cli_scope_and_stdout(server, expected, monkeypatch, capsys):
+    monkeypatch.setenv('IBM_CLOUD_API_KEY', 'apikey')
+
+    assert main(['--api-endpoint', server.api_base_url, '--format', 'jsonl', '--org', 'organization 1', '--quiet']) == 0
+
+    output = capsys.readouterr()
+    rows = [json.loads(line) for line in output.out.splitlines()]
+    assert getRows(rows) == [row for row in expected if row['org_name'] == 'organization 1']
+    assert output.err == ''
+
+
+def test_cli_error(monkeypatch, capsys):
+    monkeypatch.delenv('IBM_CLOUD_API_KEY', raising=False)
+    monkeypatch.delenv('IBM_CLOUD_IBMID', raising=False)
+
+    assert main(['--quiet']) == 1
+    assert 'You must specify' in capsys.readouterr().err
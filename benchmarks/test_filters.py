@@ -0,0 +1,94 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Filter index and service instance filter tests (run with: python -m pytest benchmarks)
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.collector import Collector
+from cfservices.filters import FilterIndex, ServiceInstanceFilter
+
+from mockcf import MockData, MockServer
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['standard', 'compact'])
+def services_df(request):
+    server = MockServer(MockData(organizations=4, spaces_per_organization=3, services=6, service_plans=12, service_instances=300)).start()
+    collector = Collector(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url, compact=request.param)
+    collector.verbose = False
+    yield collector.collect()
+    server.stop()
+
+
+def test_filter_index(services_df):
+    index = FilterIndex(services_df)
+
+    assert set(index.getServiceOptions()) == set(services_df.service_guid)
+    names = [index.service_names[guid] for guid in index.getServiceOptions()]
+    assert names == sorted(names, key=str.lower)
+
+    service_guid = index.getServiceOptions()[0]
+    services = services_df[services_df.service_guid == service_guid]
+    assert set(index.getServicePlanOptions(service_guid)) == set(services.service_plan_name)
+    plan_name = index.getServicePlanOptions(service_guid)[0]
+    plans = services[services.service_plan_name == plan_name]
+    assert set(index.getOrgOptions(service_guid, plan_name)) == set(plans.org_guid)
+    org_guid = index.getOrgOptions(service_guid, plan_name)[0]
+    assert set(index.getSpaceOptions(service_guid, plan_name, org_guid)) == set(plans[plans.org_guid == org_guid].space_guid)
+
+    # no selection = all options
+    assert set(index.getOrgOptions()) == set(services_df.org_guid)
+    assert set(index.getSpaceOptions(org_guid=org_guid)) == set(services_df[services_df.org_guid == org_guid].space_guid)
+    assert index.getServicePlanOptions('unknown') == []
+
+
+def test_filter_index_regions(services_df):
+    df = services_df.astype(object).assign(region=['us-south' if i % 2 else 'eu-gb' for i in range(len(services_df))])
+    index = FilterIndex(df)
+    # organization names are not unique across regions
+    assert all(name.endswith(')') for name in index.org_names.values())
+
+
+def test_service_instance_filter(services_df):
+    original = services_df.copy()
+    service_filter = ServiceInstanceFilter(services_df)
+    org_guid = services_df.org_guid.iloc[0]
+    service_guid = services_df.service_guid.iloc[0]
+
+    matches = service_filter.getMatches(org_guid=org_guid, service_guid=service_guid)
+    expected = services_df[(services_df.org_guid == org_guid) & (services_df.service_guid == service_guid)]
+    assert list(matches.service_instance_guid) == list(expected.sort_values('service_instance_name').service_instance_guid)
+    # results are cached
+    assert service_filter.getMatches(org_guid=org_guid, service_guid=service_guid) is matches
+
+    assert len(service_filter.getMatches()) == len(services_df)
+    assert len(service_filter.getMatches(space_guid='unknown')) == 0
+    # the DataFrame is not modified
+    assert services_df.equals(original)
+
+
+def test_service_instance_filter_sort(services_df):
+    service_filter = ServiceInstanceFilter(services_df)
+    matches = service_filter.getMatches(sort_by='space_name')
+
+    # sorted by space name (case-insensitive), then by service instance name
+    keys = [(str(space_name).lower(), name) for space_name, name in zip(matches.space_name, matches.service_instance_name)]
+    assert keys == sorted(keys)
@@ -0,0 +1,82 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Snapshot store tests (run with: python -m pytest benchmarks)
+
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.collector import Collector
+
+from mockcf import MockData, MockServer
+
+pytest.importorskip('pyarrow')
+
+from cfservices.snapshot import SnapshotStore
+
+
+@pytest.fixture(scope='module')
+def collector():
+    server = MockServer(MockData(organizations=3, service_instances=200)).start()
+    collector = Collector(ibm_cloud_user_api_token='apikey', api_base_url=server.api_base_url, compact=True)
+    collector.verbose = False
+    collector.data = collector.collect()
+    yield collector
+    server.stop()
+
+
+@pytest.mark.parametrize('data_format', ['parquet', 'arrow'])
+def test_round_trip(collector, tmpdir, data_format):
+    directory = str(tmpdir.join('snapshots'))
+    os.makedirs(directory)
+    store = SnapshotStore(directory=directory, data_format=data_format)
+    umask = os.umask(0o022)
+    try:
+        store.save(collector.getCacheKey(), collector.cfdata, collector.data, high_water_mark=collector.high_water_mark)
+    finally:
+        os.umask(umask)
+
+    snapshot = store.load(collector.getCacheKey())
+    assert not snapshot['expired']
+    assert snapshot['high_water_mark'] == collector.high_water_mark
+    assert snapshot['cfdata']['spaces'] == collector.cfdata['spaces']
+    assert snapshot['data'].astype(str).equals(collector.data.astype(str))
+    # the snapshot files are only readable by the current user
+    for path in store.getPaths(collector.getCacheKey(), data_format):
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_expiry(collector, tmpdir):
+    store = SnapshotStore(directory=str(tmpdir), ttl=60)
+    store.save('key', collector.cfdata, collector.data, high_water_mark=collector.high_water_mark)
+    assert store.load('key') is not None
+
+    store.ttl = 0
+    time.sleep(0.01)
+    assert store.load('key') is None
+    snapshot = store.load('key', include_expired=True)
+    assert snapshot['expired']
+    assert len(snapshot['data']) == len(collector.data)
+
+    store.invalidate('key')
+    assert store.load('key', include_expired=True) is None
+    assert os.listdir(str(tmpdir)) == []
@@ -0,0 +1,80 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Token cache tests against the mock UAA token endpoint (run with: python -m pytest benchmarks)
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfservices.client import Client
+from cfservices.tokens import TokenManager
+
+from mockcf import MockData, MockServer
+
+
+@pytest.fixture
+def server():
+    server = MockServer(MockData(organizations=2, service_instances=10), passwords={'alice': 'right'}).start()
+    yield server
+    server.stop()
+
+
+def getClient(server, token_manager, password='right'):
+    return Client(ibmid='alice', password=password, api_base_url=server.api_base_url, token_manager=token_manager)
+
+
+def test_cache_hit(server):
+    token_manager = TokenManager()
+    client = getClient(server, token_manager)
+    other = getClient(server, token_manager)
+
+    assert other.token == client.token
+    assert other.get('/v2/organizations').status_code == 200
+    assert server.grants == {'password': 1}
+
+
+def test_refresh_near_expiry(server):
+    token_manager = TokenManager(refresh_margin=120)
+    client = getClient(server, token_manager)
+    entry = list(token_manager.tokens.values())[0]
+    entry['expires_at'] = time.time() + 60
+
+    assert client.getAccessToken() == 'bearer access-token'
+    assert server.grants == {'password': 1, 'refresh_token': 1}
+    assert list(token_manager.tokens.values())[0]['expires_at'] > time.time() + 1000
+
+
+def test_wrong_password(server, tmpdir):
+    cache_file = str(tmpdir.join('tokens.json'))
+    getClient(server, TokenManager(cache_file=cache_file))
+
+    # the cache key does not include the password, but the cached token must not be returned for another one
+    with pytest.raises(Exception):
+        getClient(server, TokenManager(cache_file=cache_file), password='WRONG')
+    token_manager = TokenManager(cache_file=cache_file)
+    with pytest.raises(Exception):
+        getClient(server, token_manager, password='WRONG')
+
+    getClient(server, token_manager)
+    assert server.grants == {'password': 3}
+    with open(cache_file) as cache:
+        assert 'right' not in cache.read()
+    assert oct(os.stat(cache_file).st_mode & 0o777) == oct(0o600)
@@ -0,0 +1,230 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Requires Python 3.7+ and aiohttp (pip install cfservices[async])
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import aiohttp
+
+from .collector import Collector
+from .decoding import decodePage
+
+
+class AsyncConcurrencyLimiter:
+    def __init__(self, limiter, max_limit=None):
+        """
+        asyncio counterpart of ConcurrencyLimiter: limits the number of requests in flight to the current limit of
+        limiter (which the RequestPolicy adjusts) and to max_limit. Must be created by a coroutine of the event loop
+        that uses it.
+        """
+        self.limiter = limiter
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    def getLimit(self):
+        limit = self.limiter.getLimit()
+        return limit if self.max_limit is None else min(limit, self.max_limit)
+
+    async def __aenter__(self):
+        async with self.condition:
+            while self.in_flight >= self.getLimit():
+                await self.condition.wait()
+            self.in_flight += 1
+
+    async def __aexit__(self, *args):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+class AsyncCollector(Collector):
+    """
+    asyncio based alternative to the Collector. Produces the same cfdata and DataFrame, but retrieves
+    the organization, service, service plan and service instance listings in parallel. At most
+    max_concurrency requests are in flight at any given time. Shared catalogs and incremental decoding are
+    supported; scoped and v3 collections are performed by the Collector on a worker thread.
+    """
+
+    async def getAccessTokenAsync(self):
+        """
+        Return the access token of the client. Minting or refreshing it (blocking requests) happens on a worker thread.
+        """
+        client = self.client
+        token = client.token_manager.getCachedToken(client.token_manager.getKey(client.base_URL, client.id, client.password), client.password)
+        if token is None:
+            token = await asyncio.get_running_loop().run_in_executor(None, client.getAccessToken)
+        return token
+
+    async def fetchPageAsync(self, session, url, description, fields=None):
+        """
+        Retrieve a single page of a Cloud Foundry v2 listing and return the decoded response body (see
+        decoding.decodePage for fields). Transient
+        errors are retried and the number of requests in flight is adapted according to the client's policy
+        (see RequestPolicy). If the access token is rejected, the request is retried once with a new token.
+        """
+        policy = self.client.policy
+        start = time.time()
+        retries = 0
+        token_refreshed = False
+        while True:
+            token = await self.getAccessTokenAsync()
+            async with self.limiter:
+                try:
+                    async with session.get(self.client.base_URL.format(url), headers={'authorization': token}) as response:
+                        body = await response.read()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                    response = None
+                    error = ex
+            policy.onResponse(response.status if response is not None else None)
+            if response is None:
+                if not policy.isRetryable('GET', retries):
+                    self.metrics.recordRequest('GET', url, None, time.time() - start, 0, retries)
+                    raise error
+            elif response.status == 401 and not token_refreshed:
+                # the token was revoked or expired early; retry once with a new one
+                self.client.token_manager.invalidate(self.client.base_URL, self.client.id, self.client.password)
+                token_refreshed = True
+                retries += 1
+                continue
+            elif response.status == 200 or not policy.isRetryable('GET', retries, response.status):
+                break
+            # rate limited or transient error; the limiter slot is released while waiting
+            await asyncio.sleep(policy.getDelay(retries, response))
+            retries += 1
+
+        self.metrics.recordRequest('GET', url, response.status, time.time() - start, len(body), retries)
+        if response.status == 200:
+            return decodePage(body, fields)
+        else:
+            raise Exception('Fatal error retrieving {} (GET {}): {}'.format(description, url, response.status))
+
+    async def fetchPagesAsync(self, session, url, description, fields=None):
+        """
+        Return all pages of a paginated Cloud Foundry v2 listing, in order. The first page is retrieved
+        to determine total_pages; the remaining ?page=N requests are issued concurrently.
+        """
+        first_page = await self.fetchPageAsync(session, url, description, fields)
+        total_pages = first_page.get('total_pages') or 1
+        separator = '&' if '?' in url else '?'
+        pages = await asyncio.gather(*[self.fetchPageAsync(session, '{}{}page={}'.format(url, separator, page_number), description, fields)
+                                       for page_number in range(2, total_pages + 1)])
+        return [first_page] + list(pages)
+
+    async def loadListingAsync(self, session, url, description, handler, phase=None, fields=None):
+        """
+        Retrieve all pages of a Cloud Foundry v2 listing and invoke handler for each resource. If phase
+        is specified, the duration is recorded in the metrics (phases overlap).
+        """
+        start = time.time()
+        for page in await self.fetchPagesAsync(session, url, description, fields):
+            for resource in page.get('resources', []):
+                handler(resource)
+        if phase is not None:
+            self.metrics.recordPhase(phase, time.time() - start)
+
+    async def loadOrganizationsAndSpacesAsync(self, session):
+        """
+        Load the organizations and then the spaces that this id has access to
+        """
+        await self.loadListingAsync(session, '/v2/organizations?results-per-page=100', 'organization list', self.addOrganization, 'organizations')
+
+        start = time.time()
+        if self.spaces_mode == 'global':
+            try:
+                await self.loadListingAsync(session, '/v2/spaces?results-per-page=100', 'space list', self.addSpace, 'spaces')
+                return
+            except Exception as ex:
+                # some foundations restrict the global listing; fall back to the per-organization listings
+                if self.verbose:
+                    print(' Space list could not be loaded ({}). Searching for spaces by organization...'.format(ex))
+                self.cfdata['spaces'] = {}
+
+        await asyncio.gather(*[self.loadListingAsync(session,
+                                                     '/v2/organizations/{}/spaces?results-per-page=100'.format(org_guid),
+                                                     'space list',
+                                                     self.addSpace)
+                               for org_guid in list(self.cfdata['organizations'].keys())])
+        self.metrics.recordPhase('spaces', time.time() - start)
+
+    async def collectAsync(self):
+        """
+        Collect information about Cloud Foundry service instances that the specified id has access to. Returns a Pandas DataFrame.
+        """
+
+        # generate Pandas DataFrame and return it
+        return self.getDataFrame(await self.collectRecordsAsync())
+
+    async def collectRecordsAsync(self):
+        """
+        Collect information about Cloud Foundry service instances that the specified id has access to. Returns a list of rows.
+        """
+
+        if self.isScoped() or self.api_version == 3:
+            # a scoped or v3 collection takes only a few (filtered or large) pages, which the Collector retrieves on a
+            # worker thread
+            return await asyncio.get_running_loop().run_in_executor(None, Collector.collectRecords, self)
+
+        self.high_water_mark = self.getHighWaterMark()
+
+        self.limiter = AsyncConcurrencyLimiter(self.client.policy.limiter, self.max_concurrency)
+        for name in ['organizations', 'spaces', 'services', 'service_plans']:
+            self.cfdata[name] = {}
+        self.cfdata['service_instances'] = []
+        self.service_plan_offerings = {}
+
+        listings = []
+        if self.catalogs is not None:
+            # shared catalogs
+            self.loadCatalogs()
+        else:
+            listings = [('/v2/services?results-per-page=100', 'service list', self.addService, 'services'),
+                        ('/v2/service_plans?results-per-page=100', 'service plan information', self.addServicePlan, 'service_plans')]
+
+        # service instance pages are retrieved along with the lookup information and converted once all names are known
+        service_instances = []
+
+        if self.verbose:
+            print('Searching for organizations, spaces, services and service instances...')
+
+        async with aiohttp.ClientSession(headers={'accept': 'application/json', 'content-type': 'application/json'},
+                                         connector=aiohttp.TCPConnector(limit=self.max_concurrency)) as session:
+            await asyncio.gather(self.loadOrganizationsAndSpacesAsync(session),
+                                 self.loadListingAsync(session, '/v2/service_instances?results-per-page=100', 'service instance information',
+                                                       service_instances.append, 'service_instances', self.getServiceInstanceFields()),
+                                 *[self.loadListingAsync(session, *listing) for listing in listings])
+
+        self.cfdata['service_instances'] = [self.getServiceInstance(resource) for resource in service_instances]
+
+        if self.verbose:
+            print('Data collection completed.')
+
+        return self.cfdata['service_instances']
+
+    def collectRecords(self):
+        """
+        Blocking wrapper around collectRecordsAsync(); collect() returns the rows as a Pandas DataFrame
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.collectRecordsAsync())
+        # an event loop is already running in this thread (e.g. in a notebook)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.collectRecordsAsync()).result()
@@ -14,33 +14,108 @@
 # limitations under the License.
 # -------------------------------------------------------------------------------
 
+import time
+
+from .client import Client
 from .collector import Collector
-from .visualizer import Visualizer
+from .multi import MultiAccountCollector, MultiRegionCollector
+from .refresh import InventoryRefresher
+from .snapshot import SnapshotStore
 
 class Browser:
-    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, **kwargs):
+    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, api_endpoints=None, api_keys=None, snapshot_ttl=None, snapshot_dir='~/.cfservices/snapshots', refresh_interval=None, **kwargs):
         """
-        Gathers and visualizes service instance information from Cloud Foundry.
+        Gathers and visualizes service instance information from Cloud Foundry. To collect information from
+        multiple regions specify api_endpoints (see MultiRegionCollector), to collect information for multiple
+        identities specify a list of api_keys (see MultiAccountCollector). If snapshot_ttl (in seconds)
+        is specified, the collected information is stored in snapshot_dir and reused while it is fresh. Expired
+        snapshots are updated incrementally. To only collect the service instances in some organizations or
+        spaces (names or guids) or of some services (labels) specify orgs, spaces or services (see Collector).
+        The app's Refresh button collects the information again in the background (incrementally if possible);
+        to refresh it periodically specify refresh_interval (in seconds).
         """
 
         # verify mandatory parameters
-        if ibm_cloud_user_api_token is None and (ibmid is None or password is None):
+        if ibm_cloud_user_api_token is None and (ibmid is None or password is None) and not api_keys:
         	raise Exception('You must specify an IBM Cloud user api_token or an ibmid and password.')
 
-        # retrieve the required information from IBM Cloud / Cloud Foundry
-        self.service_instance_df = Collector(ibm_cloud_user_api_token = ibm_cloud_user_api_token,
-                                             ibmid = ibmid, 
-                                             password = password).collect()
+        # the app requires the notebook stack, which is optional (e.g. for the cfservices command); fail before collecting
+        try:
+            import pixiedust
+        except ImportError:
+            raise Exception('The service credential browser requires pixiedust. Install it using pip install cfservices[notebook].')
+
+        # the clients (connection pool and access token) are shared by the collector and the visualizer
+        if api_keys:
+            if api_endpoints is not None:
+                raise Exception('api_keys and api_endpoints cannot be combined.')
+            collector = MultiAccountCollector(api_keys = api_keys, **kwargs)
+            self.client = None
+            visualizer_options = {'clients': collector.clients}
+        elif api_endpoints is None:
+            self.client = Client(ibm_cloud_user_api_token = ibm_cloud_user_api_token,
+                                 ibmid = ibmid,
+                                 password = password,
+                                 **kwargs)
+            collector = Collector(client = self.client, **kwargs)
+            visualizer_options = {'client': self.client}
+        else:
+            collector = MultiRegionCollector(ibm_cloud_user_api_token = ibm_cloud_user_api_token,
+                                             ibmid = ibmid,
+                                             password = password,
+                                             api_endpoints = api_endpoints,
+                                             **kwargs)
+            self.client = None
+            visualizer_options = {'clients': collector.clients}
+
+        # optionally load the information from a recent snapshot instead of collecting it again
+        snapshot_store = None
+        snapshot = None
+        if snapshot_ttl is not None:
+            snapshot_store = SnapshotStore(directory = snapshot_dir, ttl = snapshot_ttl)
+            snapshot = snapshot_store.load(collector.getCacheKey(), include_expired = True)
+
+        if snapshot is not None and not snapshot['expired']:
+            print('Loaded service instance information collected at {}.'.format(time.ctime(snapshot['created_at'])))
+            self.cfdata = snapshot['cfdata']
+            self.service_instance_df = snapshot['data']
+            high_water_mark = snapshot.get('high_water_mark')
+            updated_at = snapshot['created_at']
+        else:
+            # retrieve the required information from IBM Cloud / Cloud Foundry
+            if snapshot is not None and snapshot.get('high_water_mark') is not None:
+                # only retrieve what has changed since the snapshot was taken
+                self.service_instance_df = collector.collectChanges(snapshot['cfdata'], snapshot['data'], snapshot['high_water_mark'])
+            else:
+                self.service_instance_df = collector.collect()
+            self.cfdata = collector.cfdata
+            high_water_mark = collector.high_water_mark
+            updated_at = time.time()
+            if snapshot_store is not None:
+                snapshot_store.save(collector.getCacheKey(),
+                                    self.cfdata,
+                                    self.service_instance_df,
+                                    high_water_mark = collector.high_water_mark)
+
+        # the app collects the information again on a worker thread, so that the notebook remains responsive
+        self.refresher = InventoryRefresher(collector,
+                                            self.service_instance_df,
+                                            cfdata = dict(self.cfdata),
+                                            high_water_mark = high_water_mark,
+                                            interval = refresh_interval,
+                                            snapshot_store = snapshot_store,
+                                            updated_at = updated_at)
 
         # visualize the collected information
         # The following is a PixieApp, which expects invocation parameters to be passed to the run() method in a dictionary
-        Visualizer().run({'data': self.service_instance_df,
-                          'api_token': ibm_cloud_user_api_token,
-                          'ibmid': ibmid, 
-                          'password': password})
+        # (pixiedust and the notebook stack are only imported when the visualizer is used)
+        from .visualizer import Visualizer
+        visualizer_options['data'] = self.service_instance_df
+        visualizer_options['refresher'] = self.refresher
+        Visualizer().run(visualizer_options)
 
     def getPandasDataFrame(self):
     	"""
-    	Returns the gathers service instance information as a Pandas DataFrame
+    	Returns the gathers service instance information (as of the most recent refresh) as a Pandas DataFrame
     	"""
-    	return self.service_instance_df
+    	return self.refresher.data
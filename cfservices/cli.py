@@ -0,0 +1,183 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Headless service instance inventory export, e.g.
+# 
+#  $ cfservices --api-key $IBM_CLOUD_API_KEY --format jsonl --output inventory.jsonl
+# 
+# Only the modules that are needed for data collection are imported (no notebook stack).
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+FORMATS = ['csv', 'json', 'jsonl', 'parquet', 'arrow']
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(prog='cfservices',
+                                     description='Export the Cloud Foundry service instances that an IBM Cloud id has access to.')
+    parser.add_argument('--api-key', action='append', dest='api_keys', metavar='API_KEY',
+                        help='IBM Cloud user API key (default: $IBM_CLOUD_API_KEY). Repeat to collect for multiple identities.')
+    parser.add_argument('--ibmid', default=os.environ.get('IBM_CLOUD_IBMID'), help='IBMid (default: $IBM_CLOUD_IBMID)')
+    parser.add_argument('--password', default=os.environ.get('IBM_CLOUD_PASSWORD'), help='IBMid password (default: $IBM_CLOUD_PASSWORD)')
+    parser.add_argument('--api-endpoint', action='append', dest='api_endpoints', metavar='ENDPOINT',
+                        help='Cloud Foundry API endpoint URL or region name (default: https://api.ng.bluemix.net). Repeat to collect from multiple regions.')
+    parser.add_argument('--format', choices=FORMATS, default='csv', help='output format (default: csv; parquet and arrow require --output and pyarrow)')
+    parser.add_argument('--output', '-o', default='-', help='output file (default: stdout)')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='maximum number of requests in flight (default: 8)')
+    parser.add_argument('--api-version', type=int, choices=[2, 3], default=2, help='Cloud Foundry API version (default: 2; 3 falls back to 2 if unavailable)')
+    parser.add_argument('--spaces-mode', choices=['global', 'per_org'], default='global', help='how spaces are listed (default: global)')
+    parser.add_argument('--org', action='append', dest='orgs', metavar='ORG',
+                        help='only export the service instances in this organization (name or guid). Can be repeated.')
+    parser.add_argument('--space', action='append', dest='spaces', metavar='SPACE',
+                        help='only export the service instances in this space (name or guid). Can be repeated.')
+    parser.add_argument('--service', action='append', dest='services', metavar='LABEL',
+                        help='only export the service instances of this service (label, e.g. cloudantNoSQLDB). Can be repeated.')
+    parser.add_argument('--metrics', action='store_true', help='print request and phase metrics (OpenMetrics format) to stderr')
+    parser.add_argument('--quiet', '-q', action='store_true', help='do not print progress information')
+    return parser
+
+
+def getCollector(args, metrics=None):
+    """
+    Return a collector for the specified command line arguments. Requests are recorded in metrics.
+    """
+    api_keys = args.api_keys or ([os.environ['IBM_CLOUD_API_KEY']] if os.environ.get('IBM_CLOUD_API_KEY') and args.ibmid is None else [])
+    options = {'max_concurrency': args.max_concurrency,
+               'spaces_mode': args.spaces_mode,
+               'api_version': args.api_version,
+               'orgs': args.orgs,
+               'spaces': args.spaces,
+               'services': args.services,
+               'metrics': metrics}
+
+    if len(api_keys) > 1:
+        if args.api_endpoints is not None and len(args.api_endpoints) > 1:
+            raise Exception('Multiple API keys and multiple API endpoints cannot be combined.')
+        from .multi import getEndpoints, MultiAccountCollector
+        if args.api_endpoints is not None:
+            options['api_base_url'] = list(getEndpoints(args.api_endpoints).values())[0]
+        return MultiAccountCollector(api_keys = api_keys, **options)
+
+    credentials = {'ibm_cloud_user_api_token': api_keys[0] if api_keys else None,
+                   'ibmid': args.ibmid,
+                   'password': args.password}
+    if args.api_endpoints is not None and len(args.api_endpoints) > 1:
+        from .multi import MultiRegionCollector
+        return MultiRegionCollector(api_endpoints = args.api_endpoints, **dict(credentials, **options))
+
+    from .collector import Collector
+    if args.api_endpoints is not None:
+        from .multi import getEndpoints
+        options['api_base_url'] = list(getEndpoints(args.api_endpoints).values())[0]
+    return Collector(**dict(credentials, **options))
+
+
+def getRows(collector):
+    """
+    Generator: yield the service instance rows (dictionaries). Rows are streamed if the collector supports it.
+    """
+    if hasattr(collector, 'iterServiceInstances'):
+        for service in collector.iterServiceInstances():
+            yield service
+    else:
+        df = collector.collect()
+        for service in df.astype(object).where(df.notnull(), None).to_dict('records'):
+            yield service
+
+
+class RowWriter:
+    def __init__(self, output, output_format, columns):
+        """
+        Writes service instance rows to a file name or file object in csv or json (array) format (see export for the other formats)
+        """
+        self.owns_output = not hasattr(output, 'write')
+        self.output = open(output, 'w') if self.owns_output else output
+        self.output_format = output_format
+        self.count = 0
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(self.output, fieldnames=columns, restval='', extrasaction='ignore')
+            self.writer.writeheader()
+        elif output_format == 'json':
+            self.output.write('[')
+
+    def write(self, row):
+        if self.output_format == 'csv':
+            self.writer.writerow(dict((key, value) for key, value in row.items() if value is not None))
+        else:
+            self.output.write('{}\n{}'.format(',' if self.count > 0 else '', json.dumps(row, default=str)))
+        self.count += 1
+
+    def close(self):
+        if self.output_format == 'json':
+            self.output.write('\n]\n')
+        if self.owns_output:
+            self.output.close()
+        else:
+            self.output.flush()
+
+
+def main(argv=None):
+    """
+    Console entry point
+    """
+    parser = getArgumentParser()
+    args = parser.parse_args(argv)
+    if args.format in ['parquet', 'arrow'] and args.output == '-':
+        parser.error('--format {} requires --output'.format(args.format))
+
+    # progress information must not be mixed with the exported data
+    stdout = sys.stdout
+    sys.stdout = sys.stderr if not args.quiet else open(os.devnull, 'w')
+    output = stdout if args.output == '-' else args.output
+    try:
+        from .metrics import Metrics
+        metrics = Metrics()
+        collector = getCollector(args, metrics)
+        if hasattr(collector, 'verbose'):
+            collector.verbose = not args.quiet
+
+        from .collector import Collector
+        columns = list(Collector.SERVICE_INSTANCE_COLUMNS) + [column for column in ['region', 'identity'] if column == getattr(collector, 'column', None)]
+        if args.format in ['csv', 'json']:
+            writer = RowWriter(output, args.format, columns)
+            for row in getRows(collector):
+                writer.write(row)
+        else:
+            from .export import getWriter
+            writer = getWriter(output, args.format, columns = columns)
+            for row in getRows(collector):
+                writer.write([row])
+        writer.close()
+
+        sys.stdout.write('Exported {} service instances.\n'.format(writer.count))
+        if args.metrics:
+            sys.stderr.write(metrics.toOpenMetrics())
+    except Exception as ex:
+        sys.stderr.write('{}\n'.format(ex))
+        return 1
+    finally:
+        if sys.stdout is not sys.stderr:
+            sys.stdout.close()
+        sys.stdout = stdout
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
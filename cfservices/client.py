@@ -0,0 +1,133 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import Metrics
+from .policy import RequestPolicy
+from .tokens import getTokenManager
+
+
+class Client:
+    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, api_base_url='https://api.ng.bluemix.net{}', pool_size=16, token_manager=None, token_cache_file=None, metrics=None, policy=None, **kwargs):
+        """
+        Cloud Foundry API client that is shared by the Collector and the Visualizer. Owns a keep-alive
+        connection pool, the default request headers and the access token. Access tokens are obtained
+        from token_manager (by default a cache that is shared by all clients in this process). Specify
+        token_cache_file to also persist tokens on disk, which avoids minting new tokens on warm starts.
+        Requests are recorded in metrics (see Metrics), which can be shared by multiple clients. Transient errors
+        are retried and the number of requests in flight is adapted to the API's rate limits according to policy
+        (see RequestPolicy; by default pool_size requests are allowed in flight).
+        """
+
+        if ibm_cloud_user_api_token is None and (ibmid is None or password is None):
+            raise Exception('You must specify an IBM Cloud user api_token or an ibmid and password.')
+
+        if ibm_cloud_user_api_token is not None:
+            self.id = 'apikey'
+            self.password = ibm_cloud_user_api_token
+        else:
+            self.id = ibmid
+            self.password = password
+
+        self.base_URL = api_base_url
+
+        # connections are kept alive and reused across requests (and threads)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, int(pool_size)))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'accept': 'application/json',
+            'content-type': 'application/json'
+        })
+
+        # access tokens are cached (and refreshed before they expire) by the token manager
+        if token_manager is None:
+            token_manager = getTokenManager(token_cache_file)
+        self.token_manager = token_manager
+
+        # request instrumentation
+        if metrics is None:
+            metrics = Metrics()
+        self.metrics = metrics
+
+        # retries and adaptive concurrency limit
+        if policy is None:
+            policy = RequestPolicy(max_concurrency = pool_size)
+        self.policy = policy
+
+        # fail early if the credentials are invalid
+        self.getAccessToken()
+
+    @property
+    def token(self):
+        """
+        Access token (including type, e.g. "Bearer 012345")
+        """
+        return self.getAccessToken()
+
+    def getAccessToken(self):
+        """
+        Return a valid access token for the provided id and password, minting or refreshing it if necessary
+        """
+        return self.token_manager.getToken(self.session, self.base_URL, self.id, self.password)
+
+    def getCacheKey(self):
+        """
+        Return a key that identifies the API endpoint and user of this client (without revealing the secret)
+        """
+        return self.token_manager.getKey(self.base_URL, self.id, self.password)
+
+    def get(self, url):
+        """
+        Issue an authenticated GET request for the specified API path (e.g. '/v2/organizations') and return the response
+        """
+        start = time.time()
+        retries = 0
+        token_refreshed = False
+        while True:
+            try:
+                with self.policy.limiter.slot():
+                    response = self.session.get(self.base_URL.format(url), headers={'authorization': self.token})
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.policy.onResponse(None)
+                if not self.policy.isRetryable('GET', retries):
+                    self.metrics.recordRequest('GET', url, None, time.time() - start, 0, retries)
+                    raise
+                time.sleep(self.policy.getDelay(retries))
+                retries += 1
+                continue
+
+            self.policy.onResponse(response.status_code)
+            if response.status_code == 401 and not token_refreshed:
+                # the token was revoked or expired early; retry once with a new one
+                self.token_manager.invalidate(self.base_URL, self.id, self.password)
+                token_refreshed = True
+                retries += 1
+                continue
+            if response.status_code != 200 and self.policy.isRetryable('GET', retries, response.status_code):
+                # rate limited or transient server error
+                time.sleep(self.policy.getDelay(retries, response))
+                retries += 1
+                continue
+            break
+
+        self.metrics.recordRequest('GET', url, response.status_code, time.time() - start, len(response.content), retries)
+        return response
@@ -14,30 +14,96 @@
 # limitations under the License.
 # -------------------------------------------------------------------------------
 
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
-import pandas as pd
-import requests
-import urllib
+import re
+import time
+try:
+    from urllib.parse import quote, urlparse
+except ImportError:
+    from urllib import quote        # Python 2
+    from urlparse import urlparse
+try:
+    from sys import intern
+except ImportError:
+    pass    # Python 2: intern is a builtin
+
+from .client import Client
+from .decoding import decodePage
+from .frames import toColumns, toDataFrame
 
 
 class Collector:
-    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, **kwargs):
 
-        if ibm_cloud_user_api_token is None and (ibmid is None or password is None):
-          raise Exception('You must specify an IBM Cloud user api_token or an ibmid and password.')
+    # service instance properties that are retrieved from Cloud Foundry (all other columns are derived)
+    SERVICE_INSTANCE_PROPERTIES = ['service_instance_name', 'service_instance_guid', 'service_guid', 'created_at', 'service_plan_guid', 'space_guid']
 
-        if ibm_cloud_user_api_token is not None:
-            self.id = 'apikey'
-            self.password = ibm_cloud_user_api_token
-        else:
-            self.id = ibmid
-            self.password = password             
+    # service instance resource properties that are needed to compose a row (see decoding.decodePage)
+    SERVICE_INSTANCE_FIELDS = {'metadata': ['guid', 'created_at'],
+                               'entity': ['name', 'service_guid', 'service_plan_guid', 'space_guid']}
+
+    # columns of a service instance row
+    SERVICE_INSTANCE_COLUMNS = SERVICE_INSTANCE_PROPERTIES + ['space_name', 'org_name', 'org_guid', 'service_name', 'service_plan_name']
+
+    # Cloud Foundry v3 service instance listing: managed service instances only (like /v2/service_instances), with the
+    # names of their spaces and organizations (included in the response)
+    V3_SERVICE_INSTANCES_URL = ('/v3/service_instances?type=managed&per_page=5000'
+                                '&fields[space]=guid,name,relationships.organization&fields[space.organization]=guid,name')
+
+    # organization, space and service scope values that are guids (all other values are names or labels)
+    GUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+    # maximum number of values in a server-side filter (longer lists are split across multiple listings)
+    MAX_FILTER_VALUES = 50
+
+    # seconds subtracted from high water marks to account for clock differences between this host and Cloud Foundry
+    CLOCK_SKEW = 300
+
+    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, max_concurrency=8, spaces_mode='global', client=None, compact=False, catalogs=None, incremental_decoding=False, api_version=2, orgs=None, spaces=None, services=None, **kwargs):
+
+        # maximum number of page requests that are in flight at any given time (1 = follow next_url sequentially)
+        self.max_concurrency = max(1, int(max_concurrency))
+
+        # reuse the caller's client (connection pool and access token) if one was provided
+        if client is None:
+            kwargs.setdefault('pool_size', self.max_concurrency)
+            client = Client(ibm_cloud_user_api_token = ibm_cloud_user_api_token,
+                            ibmid = ibmid,
+                            password = password,
+                            **kwargs)
+        self.client = client
 
         self.verbose = True # TODO
 
-        self.base_URL = 'https://api.ng.bluemix.net{}'
-        self.token = self.getAccessToken()  # access token (including type, e.g. "Bearer 012345") or None
+        # 'global': load all spaces using /v2/spaces, 'per_org': load spaces for each organization separately
+        if spaces_mode not in ['global', 'per_org']:
+            raise Exception('Invalid spaces_mode "{}". Specify "global" or "per_org".'.format(spaces_mode))
+        self.spaces_mode = spaces_mode
+
+        # compact mode: intern repeated strings and return categorical columns (see frames.toCompactDataFrame)
+        self.compact = compact
+
+        # the service and service plan catalogs are not user specific and can be shared by multiple collectors
+        # (dictionary with 'services' and 'service_plans' lookup maps, see loadCatalogs); None = load them
+        self.catalogs = catalogs
+        self.service_plan_offerings = {}    # service plan guid -> service guid
+
+        # 2: Cloud Foundry v2 API, 3: Cloud Foundry v3 API (large pages and included spaces and organizations,
+        # falls back to v2 if the v3 API is not available)
+        if api_version not in [2, 3]:
+            raise Exception('Invalid api_version "{}". Specify 2 or 3.'.format(api_version))
+        self.api_version = api_version
 
+        # decode service instance pages incrementally (requires ijson), extracting only SERVICE_INSTANCE_FIELDS
+        self.incremental_decoding = incremental_decoding
+
+        # scope: only collect the service instances in these organizations and spaces (names or guids) of these
+        # services (labels or guids); None = no restriction. The scope is applied using server-side filters.
+        self.scope = {'orgs': self.getScopeValues(orgs),
+                      'spaces': self.getScopeValues(spaces),
+                      'services': self.getScopeValues(services)}
 
         self.cfdata = {
             'organizations' : {},
@@ -52,54 +118,427 @@ class Collector:
 
     def getAccessToken(self):
         """
-        Mint an access token using the provided id and password
+        Return the access token (including type, e.g. "Bearer 012345") of the client
+        """
+        return self.client.token
+
+    @property
+    def metrics(self):
+        """
+        Request and phase instrumentation of this collector (see Metrics)
+        """
+        return self.client.metrics
+
+    def getCacheKey(self):
+        """
+        Return a key that identifies the API endpoint, user and scope of this collector (without revealing the secret)
+        """
+        if not self.isScoped():
+            return self.client.getCacheKey()
+        return hashlib.sha256(u'{}\n{}'.format(self.client.getCacheKey(), json.dumps(self.scope, sort_keys=True)).encode('utf-8')).hexdigest()
+
+    def getScopeValues(self, values):
+        """
+        Normalize a scope parameter (None, a name or guid, or a list of names and guids) into None or a list
+        """
+        if values is None:
+            return None
+        if isinstance(values, str) or not hasattr(values, '__iter__'):
+            return [values]
+        return list(values)
+
+    def isScoped(self):
         """
-        response = requests.get(self.base_URL.format('/info'))
+        Return True if only the service instances in some organizations, spaces or services are collected
+        """
+        return any(values is not None for values in self.scope.values())
+
+    def fetchPage(self, url, description, fields=None):
+        """
+        Retrieve a single page of a Cloud Foundry v2 listing and return the decoded response body (see decoding.decodePage for fields)
+        """
+        response = self.client.get(url)
         if response.status_code == 200:
-            auth_endpoint = response.json()['authorization_endpoint'] + '/oauth/token'
-            data = 'grant_type=password&username={0}&password={1}'.format(self.id, self.password)
-            headers = {
-                'accept': 'application/json',
-                'content-type': 'application/x-www-form-urlencoded;charset=utf-8'
-            }
-            response = requests.post(auth_endpoint, data=data, headers=headers, auth=('cf', ''))
-            if response.status_code == 200:
-                results = response.json()
-                return results['token_type'] + ' ' + results['access_token']
-            else:
-                raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))
+            page = decodePage(response.content, fields)
+            if url.startswith('/v3/'):
+                page = self.getV3Page(page)
+            return page
         else:
-            raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))       
+            raise Exception('Fatal error retrieving {} (GET {}): {}'.format(description, url, response))
+
+    def getV3Page(self, page):
+        """
+        Add the v2 paging properties (total_results, total_pages and next_url) to a page of a Cloud Foundry v3 listing
+        """
+        pagination = page.get('pagination') or {}
+        page['total_results'] = pagination.get('total_results')
+        page['total_pages'] = pagination.get('total_pages')
+        page['next_url'] = None
+        if (pagination.get('next') or {}).get('href'):
+            # absolute URL -> API path
+            next_url = urlparse(pagination['next']['href'])
+            page['next_url'] = next_url.path + ('?' + next_url.query if next_url.query else '')
+        return page
+
+    def fetchPages(self, url, description, fields=None):
+        """
+        Generator: yield every page of a paginated Cloud Foundry v2 listing, in order. The first page
+        is retrieved to determine total_pages; the remaining ?page=N requests are issued concurrently,
+        using at most max_concurrency workers.
+        """
+        first_page = self.fetchPage(url, description, fields)
+        yield first_page
+
+        total_pages = first_page.get('total_pages') or 1
+        if total_pages < 2:
+            return
+
+        if self.max_concurrency < 2:
+            # follow next_url one page at a time
+            url = first_page.get('next_url')
+            while url is not None:
+                page = self.fetchPage(url, description, fields)
+                yield page
+                url = page.get('next_url')
+            return
+
+        separator = '&' if '?' in url else '?'
+        page_urls = iter(['{}{}page={}'.format(url, separator, page_number) for page_number in range(2, total_pages + 1)])
+
+        # keep a bounded window of outstanding requests and hand out pages in their original order
+        executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, total_pages - 1))
+        pending = deque()
+        try:
+            for page_url in page_urls:
+                pending.append(executor.submit(self.fetchPage, page_url, description, fields))
+                if len(pending) >= 2 * self.max_concurrency:
+                    break
+            while pending:
+                page = pending.popleft().result()
+                page_url = next(page_urls, None)
+                if page_url is not None:
+                    pending.append(executor.submit(self.fetchPage, page_url, description, fields))
+                yield page
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def loadListing(self, url, description, handler, fields=None):
+        """
+        Retrieve all pages of a Cloud Foundry v2 listing and invoke handler for each resource
+        """
+        for page in self.fetchPages(url, description, fields):
+            for resource in page.get('resources', []):
+                handler(resource)
+
+    def getTotalResults(self, url, description):
+        """
+        Return the number of resources in a Cloud Foundry v2 listing, without retrieving them
+        """
+        return self.fetchPage('{}{}results-per-page=1'.format(url, '&' if '?' in url else '?'), description).get('total_results', 0)
 
     def collect(self):
         """
         Collect information about Cloud Foundry service instances that the specified id has access to. Returns a Pandas DataFrame.
         """
 
-        self.cfdata['organizations'] = {}
+        # generate Pandas DataFrame and return it
+        return self.getDataFrame(self.collectRecords())
+
+    def collectColumns(self):
+        """
+        Collect information about Cloud Foundry service instances that the specified id has access to. Returns an
+        ordered dictionary of column names (see SERVICE_INSTANCE_COLUMNS) and value lists. Pandas is not required.
+        """
+        return toColumns(self.collectRecords(), self.SERVICE_INSTANCE_COLUMNS)
 
-        def fetch(url):
-            http_headers = {
-                'accept': 'application/json',
-                'content-type': 'application/json',
-                'authorization': self.token
-            }
-
-            response = requests.get(self.base_URL.format(url), headers=http_headers)
-            if response.status_code == 200:
-               for resource in response.json().get('resources', []):
-                   self.cfdata['organizations'][resource['metadata']['guid']] = resource['entity']['name']          
-               return response.json()['next_url']
+    def collectRecords(self):
+        """
+        Collect information about Cloud Foundry service instances that the specified id has access to. Returns a list
+        of rows (dictionaries, see SERVICE_INSTANCE_COLUMNS). Pandas is not required.
+        """
+
+        self.cfdata['service_instances'] = []
+        for service in self.iterServiceInstances():
+            self.cfdata['service_instances'].append(service)
+
+        if self.verbose:
+            print('Data collection completed.')
+
+        return self.cfdata['service_instances']
+
+    def iterServiceInstances(self):
+        """
+        Generator: collect information about Cloud Foundry service instances that the specified id has access to,
+        yielding one row (dictionary) per service instance as soon as the page it is on was retrieved
+        """
+        for services in self.iterServiceInstancePages():
+            for service in services:
+                yield service
+
+    def iterDataFrames(self):
+        """
+        Generator: collect information about Cloud Foundry service instances that the specified id has access to,
+        yielding one Pandas DataFrame per retrieved page
+        """
+        for services in self.iterServiceInstancePages():
+            yield self.getDataFrame(services)
+
+    def iterServiceInstancePages(self):
+        """
+        Generator: load the organization, space, service and service plan lookup information and then yield
+        the service instance rows of each page of the service instance listing. At most a few pages are kept
+        in memory at any given time.
+        """
+
+        # resources that are created or updated from now on will be picked up by collectChanges()
+        self.high_water_mark = self.getHighWaterMark()
+
+        if self.api_version == 3:
+            try:
+                pages = self.iterTimedPages(self.iterPages(self.getServiceInstanceURLs(), 'service instance information'), 'service_instances')
+                first_page = next(pages, None)
+            except Exception as ex:
+                print(' Warning. The Cloud Foundry v3 API could not be used ({}). Falling back to the v2 API.'.format(ex))
+                self.api_version = 2
             else:
-               raise Exception('Fatal error retrieving organization list: {}'.format(response))
+                if self.verbose:
+                   print('Searching for service instances...')
+                if first_page is not None:
+                    yield self.getServiceInstancesV3(first_page)
+                for page in pages:
+                    yield self.getServiceInstancesV3(page)
+                return
+
+        urls = self.getServiceInstanceURLs()
+
+        # https://apidocs.cloudfoundry.org/280/service_instances/list_all_service_instances.html
+        if self.verbose:
+           print('Searching for service instances...')
+        if self.isScoped() and self.scope['services'] is None and self.catalogs is None:
+            # only the services and service plans that the service instances in scope refer to are loaded
+            with self.metrics.phase('service_instances'):
+                resources = [resource for page in self.iterPages(urls, 'service instance information', self.getServiceInstanceFields())
+                             for resource in page.get('resources', [])]
+            self.loadReferencedCatalogs(set(resource['entity']['service_guid'] for resource in resources))
+            yield [self.getServiceInstance(resource) for resource in resources]
+            return
+
+        for page in self.iterTimedPages(self.iterPages(urls, 'service instance information', self.getServiceInstanceFields()), 'service_instances'):
+            yield [self.getServiceInstance(resource) for resource in page.get('resources', [])]
+
+    def iterTimedPages(self, pages, name):
+        """
+        Generator: yield the pages of an iterator and record the time spent fetching them as data collection
+        phase name. The time spent processing the pages (i.e. while this generator is suspended) is not included.
+        """
+        duration = 0.0
+        try:
+            while True:
+                start = time.time()
+                try:
+                    page = next(pages)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.time() - start
+                yield page
+        finally:
+            self.metrics.recordPhase(name, duration)
+
+    def iterPages(self, urls, description, fields=None):
+        """
+        Generator: yield every page of each of the specified listings (see fetchPages)
+        """
+        for url in urls:
+            for page in self.fetchPages(url, description, fields):
+                yield page
+
+    def getServiceInstanceURLs(self):
+        """
+        Load the lookup information that is needed to resolve the names of the service instances in scope and return
+        the URLs of the service instance listings that contain them (an empty list if no service instance is in scope)
+        """
+        if self.api_version == 3:
+            self.loadCatalogs()
+            for name in ['organizations', 'spaces']:
+                self.cfdata[name] = {}
+            if not self.isScoped():
+                return [self.V3_SERVICE_INSTANCES_URL]
+            return self.getScopedServiceInstanceURLsV3()
+
+        if not self.isScoped():
+            self.loadLookupData()
+            return ['/v2/service_instances?results-per-page=100']
+        return self.getScopedServiceInstanceURLs()
+
+    def getScopedServiceInstanceURLs(self):
+        """
+        Load the organizations and spaces in scope (and, if the services are scoped, the services and their service
+        plans) and return the URLs of the service instance listings in scope, e.g. /v2/spaces/<guid>/service_instances
+        """
+        for name in ['organizations', 'spaces']:
+            self.cfdata[name] = {}
+
+        if self.verbose:
+           print('Searching for organizations...')
+        with self.metrics.phase('organizations'):
+            if self.scope['orgs'] is None:
+                self.loadListing('/v2/organizations?results-per-page=100', 'organization list', self.addOrganization)
+            else:
+                for resource in self.loadScopedResources('/v2/organizations', 'organization list', self.scope['orgs']):
+                    self.addOrganization(resource)
+
+        with self.metrics.phase('spaces'):
+            org_filters = [('organization_guid', list(self.cfdata['organizations'].keys()))] if self.scope['orgs'] is not None else []
+            if self.scope['spaces'] is not None:
+                for resource in self.loadScopedResources('/v2/spaces', 'space list', self.scope['spaces'], filters = org_filters):
+                    self.addSpace(resource)
+            elif self.scope['orgs'] is not None:
+                for url in self.getFilteredURLs('/v2/spaces?results-per-page=100', org_filters):
+                    self.loadListing(url, 'space list', self.addSpace)
+            else:
+                self.loadAllSpaces()
+
+        plan_filters = []
+        if self.scope['services'] is not None:
+            service_guids = self.loadScopedCatalogs()
+            plan_filters = [('service_plan_guid', [plan_guid for plan_guid, service_guid in self.service_plan_offerings.items() if service_guid in service_guids])]
+        elif self.catalogs is not None:
+            self.loadCatalogs()
+
+        if self.scope['spaces'] is not None:
+            space_guids = list(self.cfdata['spaces'].keys())
+            if len(space_guids) == 1:
+                # https://apidocs.cloudfoundry.org/280/spaces/list_all_service_instances_for_the_space.html
+                return self.getFilteredURLs('/v2/spaces/{}/service_instances?results-per-page=100'.format(space_guids[0]), plan_filters)
+            return self.getFilteredURLs('/v2/service_instances?results-per-page=100', [('space_guid', space_guids)] + plan_filters)
+        return self.getFilteredURLs('/v2/service_instances?results-per-page=100', org_filters + plan_filters)
+
+    def getScopedServiceInstanceURLsV3(self):
+        """
+        Return the URLs of the Cloud Foundry v3 service instance listings in scope (see getScopedServiceInstanceURLs).
+        The organization and space names are included in the service instance listings.
+        """
+        filters = []
+        if self.scope['orgs'] is not None:
+            org_guids = [resource['guid'] for resource in self.loadScopedResources('/v3/organizations', 'organization list', self.scope['orgs'])]
+            filters.append(('organization_guids', org_guids))
+        if self.scope['spaces'] is not None:
+            space_guids = [resource['guid'] for resource in self.loadScopedResources('/v3/spaces', 'space list', self.scope['spaces'], filters = filters)]
+            filters = [('space_guids', space_guids)]
+        if self.scope['services'] is not None:
+            service_guids = self.getScopedServiceGUIDs()
+            filters.append(('service_plan_guids', [plan_guid for plan_guid, service_guid in self.service_plan_offerings.items() if service_guid in service_guids]))
+        return self.getFilteredURLs(self.V3_SERVICE_INSTANCES_URL, filters)
+
+    def loadScopedResources(self, path, description, values, name='name', filters=[]):
+        """
+        Return the resources of a listing (e.g. /v2/organizations) whose guid or name is one of values and that match
+        the additional filters (see getFilteredURLs). v2 resources are retrieved by guid one at a time and by name using
+        a q=name IN filter, v3 resources using the guids and names filters.
+        """
+        guids = [value for value in values if self.GUID_PATTERN.match(value)]
+        names = [value for value in values if not self.GUID_PATTERN.match(value)]
+        resources = []
+        if path.startswith('/v3/'):
+            for parameter, parameter_values in [('guids', guids), ('names', names)]:
+                if parameter_values:
+                    for url in self.getFilteredURLs('{}?per_page=5000'.format(path), [(parameter, parameter_values)] + filters):
+                        self.loadListing(url, description, resources.append)
+            return resources
+
+        for guid in guids:
+            try:
+                resources.append(self.fetchPage('{}/{}'.format(path, guid), description))
+            except Exception as ex:
+                print(' Warning. {} is not in scope. {}'.format(guid, ex))
+        if names:
+            for url in self.getFilteredURLs('{}?results-per-page=100'.format(path), [(name, names)] + filters):
+                self.loadListing(url, description, resources.append)
+        return resources
+
+    def getFilteredURLs(self, url, filters):
+        """
+        Return the URLs of the listings that together contain the resources of a listing (url) that match all filters,
+        a list of (name, values) tuples. Filters are added as v2 q=name IN values or v3 name=values query parameters.
+        Long lists of values are split across multiple listings; a filter without values matches no resources.
+        """
+        urls = [url]
+        for name, values in filters:
+            values = sorted(set(values))
+            chunks = [','.join(quote(value, safe='') for value in values[start:start + self.MAX_FILTER_VALUES])
+                      for start in range(0, len(values), self.MAX_FILTER_VALUES)]
+            if url.startswith('/v3/'):
+                parameters = ['{}={}'.format(name, chunk) for chunk in chunks]
+            else:
+                parameters = ['q={}%20IN%20{}'.format(name, chunk) for chunk in chunks]
+            urls = ['{}{}{}'.format(url, '&' if '?' in url else '?', parameter) for url in urls for parameter in parameters]
+        return urls
+
+    def getScopedServiceGUIDs(self):
+        """
+        Return the guids of the services in scope, using the (already loaded or shared) service catalog
+        """
+        return set(service_guid for service_guid, label in self.cfdata['services'].items()
+                   if service_guid in self.scope['services'] or label in self.scope['services'])
+
+    def loadScopedCatalogs(self):
+        """
+        Load the services in scope and their service plans (or use the shared catalogs) and return the guids of the
+        services in scope
+        """
+        if self.catalogs is not None:
+            self.loadCatalogs()
+            return self.getScopedServiceGUIDs()
+
+        self.service_plan_offerings = {}
+        for name in ['services', 'service_plans']:
+            self.cfdata[name] = {}
 
         # https://apidocs.cloudfoundry.org/280/services/list_all_services.html
-        url = '/v2/organizations?results-per-page=100'
+        with self.metrics.phase('services'):
+            for resource in self.loadScopedResources('/v2/services', 'service list', self.scope['services'], name = 'label'):
+                self.addService(resource)
 
-        while url is not None:
-           if self.verbose: 
-              print('Searching for organizations...')
-           url = fetch(url)
+        # https://apidocs.cloudfoundry.org/280/service_plans/list_all_service_plans.html
+        with self.metrics.phase('service_plans'):
+            for url in self.getFilteredURLs('/v2/service_plans?results-per-page=100', [('service_guid', list(self.cfdata['services'].keys()))]):
+                self.loadListing(url, 'service plan information', self.addServicePlan)
+
+        return set(self.cfdata['services'].keys())
+
+    def loadReferencedCatalogs(self, service_guids):
+        """
+        Load the services and the service plans of the specified services. The service listing is short, the
+        (much longer) service plan listing is filtered.
+        """
+        self.service_plan_offerings = {}
+        for name in ['services', 'service_plans']:
+            self.cfdata[name] = {}
+
+        # https://apidocs.cloudfoundry.org/280/services/list_all_services.html
+        with self.metrics.phase('services'):
+            self.loadListing('/v2/services?results-per-page=100', 'service list', self.addService)
+
+        # https://apidocs.cloudfoundry.org/280/service_plans/list_all_service_plans.html
+        with self.metrics.phase('service_plans'):
+            for url in self.getFilteredURLs('/v2/service_plans?results-per-page=100', [('service_guid', [guid for guid in service_guids if guid is not None])]):
+                self.loadListing(url, 'service plan information', self.addServicePlan)
+
+    def loadLookupData(self):
+        """
+        Load the organizations and spaces that this id has access to, and the services and service plans
+        """
+
+        self.cfdata['organizations'] = {}
+
+        # https://apidocs.cloudfoundry.org/280/organizations/list_all_organizations.html
+        if self.verbose:
+           print('Searching for organizations...')
+        with self.metrics.phase('organizations'):
+            self.loadListing('/v2/organizations?results-per-page=100', 'organization list', self.addOrganization)
 
 
         """
@@ -108,32 +547,26 @@ class Collector:
 
         self.cfdata['spaces'] = {}
 
-        def fetch(url):
-            http_headers = {
-                'accept': 'application/json',
-                'content-type': 'application/json',
-                'authorization': self.token
-            }
-            response = requests.get(self.base_URL.format(url), headers=http_headers)
-            if response.status_code == 200:
-               for resource in response.json().get('resources', []):
-                  self.cfdata['spaces'][resource['metadata']['guid']] = {
-                    'space_name': resource['entity']['name'],
-                    'org_guid': resource['entity']['organization_guid'],
-                    'org_name': self.cfdata['organizations'][resource['entity']['organization_guid']]
-                  }
-               return response.json()['next_url']
-            else:
-             raise Exception('Fatal error retrieving space list (GET {}): {}'.format(url, response))
+        with self.metrics.phase('spaces'):
+            self.loadAllSpaces()
 
-        # https://apidocs.cloudfoundry.org/280/organizations/list_all_spaces_for_the_organization.html
-        for org_guid in self.cfdata['organizations'].keys(): 
-            url = '/v2/organizations/{}/spaces?results-per-page=100'.format(org_guid)
-            while url is not None:
-               if self.verbose: 
-                print(' Searching for spaces in organization {}...'.format(self.cfdata['organizations'][org_guid]))
-               url = fetch(url)
+        self.loadCatalogs()
+
+    def loadCatalogs(self):
+        """
+        Load the services and service plans. Returns a dictionary that can be shared with other collectors (see catalogs).
+        """
+
+        if self.catalogs is not None:
+            self.cfdata['services'] = dict(self.catalogs['services'])
+            self.cfdata['service_plans'] = dict(self.catalogs['service_plans'])
+            self.service_plan_offerings = dict(self.catalogs.get('service_plan_offerings', {}))
+            return self.catalogs
 
+        self.service_plan_offerings = {}
+
+        if self.api_version == 3:
+            return self.loadCatalogsV3()
 
         """
         load list of services (this is not user specific)
@@ -142,25 +575,9 @@ class Collector:
 
         self.cfdata['services'] = {}
 
-        def fetch(url):
-            http_headers = {
-                'accept': 'application/json',
-                'content-type': 'application/json',
-                'authorization': self.token
-            }
-            response = requests.get(self.base_URL.format(url), headers=http_headers)
-            if response.status_code == 200:
-               for resource in response.json().get('resources', []):
-                  self.cfdata['services'][resource['metadata']['guid']] = resource['entity']['label']          
-               return response.json()['next_url']
-            else:
-               raise Exception('Fatal error retrieving service list (GET {}): {}'.format(url, response))
-
         # https://apidocs.cloudfoundry.org/280/services/list_all_services.html
-        url = '/v2/services?results-per-page=100'
-
-        while url is not None:
-           url = fetch(url)
+        with self.metrics.phase('services'):
+            self.loadListing('/v2/services?results-per-page=100', 'service list', self.addService)
 
 
         """
@@ -170,87 +587,297 @@ class Collector:
 
         self.cfdata['service_plans'] = {}
 
-        def fetch(url):
-            http_headers = {
-                'accept': 'application/json',
-                'content-type': 'application/json',
-                'authorization': self.token
-            }
-            response = requests.get(self.base_URL.format(url), headers=http_headers)
-            if response.status_code == 200:
-               for resource in response.json().get('resources', []):
-                   self.cfdata['service_plans'][resource['metadata']['guid']] = resource['entity']['name']          
-               return response.json()['next_url']                
-            else:
-               raise Exception('Fatal error retrieving service plan information (GET {}): {}'.format(url, response))
-
         # https://apidocs.cloudfoundry.org/280/service_plans/list_all_service_plans.html
-        url = '/v2/service_plans?results-per-page=100'
+        with self.metrics.phase('service_plans'):
+            self.loadListing('/v2/service_plans?results-per-page=100', 'service plan information', self.addServicePlan)
+
+        return {'services': self.cfdata['services'],
+                'service_plans': self.cfdata['service_plans'],
+                'service_plan_offerings': self.service_plan_offerings}
+
+    def loadCatalogsV3(self):
+        """
+        Load the service offerings and service plans using the Cloud Foundry v3 API (see loadCatalogs)
+        """
+        self.cfdata['services'] = {}
+        self.cfdata['service_plans'] = {}
 
-        while url is not None:
-            url = fetch(url)
+        # https://v3-apidocs.cloudfoundry.org/version/3.76.0/index.html#list-service-offerings
+        with self.metrics.phase('services'):
+            self.loadListing('/v3/service_offerings?per_page=5000', 'service list',
+                             lambda resource: self.addService(self.getV2Resource(resource, label=resource['name'])))
 
+        # https://v3-apidocs.cloudfoundry.org/version/3.76.0/index.html#list-service-plans
+        with self.metrics.phase('service_plans'):
+            self.loadListing('/v3/service_plans?per_page=5000', 'service plan information',
+                             lambda resource: self.addServicePlan(self.getV2Resource(resource,
+                                                                                     name=resource['name'],
+                                                                                     service_guid=self.getV3Relationship(resource, 'service_offering'))))
 
+        return {'services': self.cfdata['services'],
+                'service_plans': self.cfdata['service_plans'],
+                'service_plan_offerings': self.service_plan_offerings}
+
+    def getServiceInstancesV3(self, page):
+        """
+        Return the service instance rows of a page of the Cloud Foundry v3 service instance listing, adding the
+        included spaces and organizations to the lookup maps
+        """
+        included = page.get('included') or {}
+        for resource in included.get('organizations', []):
+            self.addOrganization(self.getV2Resource(resource, name=resource['name']))
+        for resource in included.get('spaces', []):
+            self.addSpace(self.getV2Resource(resource,
+                                             name=resource['name'],
+                                             organization_guid=self.getV3Relationship(resource, 'organization')))
+
+        services = []
+        for resource in page.get('resources', []):
+            service_plan_guid = self.getV3Relationship(resource, 'service_plan')
+            services.append(self.getServiceInstance(self.getV2Resource(resource,
+                                                                       name=resource['name'],
+                                                                       service_guid=self.service_plan_offerings.get(service_plan_guid),
+                                                                       service_plan_guid=service_plan_guid,
+                                                                       space_guid=self.getV3Relationship(resource, 'space'))))
+        return services
+
+    def getV2Resource(self, resource, **entity):
         """
-        load list of service instances that this id has access to
+        Return a Cloud Foundry v2 style resource (metadata and entity) for a v3 resource
+        """
+        return {'metadata': {'guid': resource['guid'],
+                             'created_at': resource.get('created_at'),
+                             'updated_at': resource.get('updated_at')},
+                'entity': entity}
 
+    def getV3Relationship(self, resource, name):
+        """
+        Return the guid of a to-one relationship of a Cloud Foundry v3 resource
         """
+        return ((resource.get('relationships') or {}).get(name) or {}).get('data', {}).get('guid')
 
-        self.cfdata['service_instances'] = []
+    def collectChanges(self, cfdata, data, since):
+        """
+        Incrementally update previously collected information. cfdata and data are the lookup maps and the
+        DataFrame returned by an earlier collect() (or collectChanges()) call and since is the high_water_mark
+        of that call. Only resources that were created or updated after since are retrieved. Deletions are
+        detected by comparing resource counts; a listing is only reloaded in full if its count does not match.
+        Returns a Pandas DataFrame.
+        """
+        return self.getDataFrame(self.collectRecordChanges(cfdata, data, since))
 
-        def fetch(url):
-            http_headers = {
-                'accept': 'application/json',
-                'content-type': 'application/json',
-                'authorization': self.token
-            }
-            response = requests.get(self.base_URL.format(url), headers=http_headers)
-            if response.status_code == 200:     
-                for resource in response.json().get('resources', []):
-                   service = {'service_instance_name':resource['entity']['name'],
-                              'service_instance_guid':resource['metadata']['guid'],
-                              'service_guid':resource['entity']['service_guid'],
-                              'created_at':resource['metadata']['created_at'],
-                              'service_plan_guid': resource['entity'].get('service_plan_guid', None),
-                              'space_guid': resource['entity'].get('space_guid', None)}
-                
-                   if self.cfdata['spaces'] is not None and self.cfdata['spaces'].get(service['space_guid'], None) is not None:
-                       service['space_name'] = self.cfdata['spaces'][service['space_guid']]['space_name']
-                       service['org_name'] = self.cfdata['spaces'][service['space_guid']]['org_name']
-                       service['org_guid'] = self.cfdata['spaces'][service['space_guid']]['org_guid']
-                        
-                   if self.cfdata['services'] is not None and self.cfdata['services'].get(service['service_guid'], None) is not None:
-                       service['service_name'] = self.cfdata['services'][service['service_guid']]
-                   else:
-                       service['service_name'] = None
-                       print(' Warning. Found no service name for service "{}" guid "{}" in org "{}" space "{}"'.format(service['service_instance_name'],
-                                                                                                                        service['service_guid'],
-                                                                                                                        service['org_name'],
-                                                                                                                        service['space_name']))                    
-                    
-                   if self.cfdata['service_plans'] is not None and self.cfdata['service_plans'].get(service['service_plan_guid'], None) is not None:
-                        service['service_plan_name'] = self.cfdata['service_plans'][service['service_plan_guid']]
-                   else:
-                        service['service_plan_name'] = None
-                        print(' Warning. Found no service plan name for service "{}" plan guid "{}" in org "{}" space "{}"'.format(service['service_instance_name'],
-                                                                                                                                   service['service_plan_guid'],
-                                                                                                                                   service['org_name'],
-                                                                                                                                   service['space_name']))
-                   self.cfdata['service_instances'].append(service)
-                return response.json()['next_url']  
-            else:
-                raise Exception('Fatal error retrieving service instance information (GET {}): {}'.format(url, response))           
+    def collectRecordChanges(self, cfdata, data, since):
+        """
+        Like collectChanges(), but data can also be a list of rows (as returned by collectRecords()) and a list
+        of rows is returned
+        """
 
-        # https://apidocs.cloudfoundry.org/280/service_instances/list_all_service_instances.html
-        url = '/v2/service_instances?results-per-page=100'
+        if self.api_version == 3 or self.isScoped():
+            # a complete v3 or scoped collection takes fewer requests than an incremental v2 collection
+            return self.collectRecords()
 
-        while url is not None:
-           if self.verbose: 
-              print('Searching for service instances...')
-           url = fetch(url)
+        try:
+            return self.collectIncrementalRecords(cfdata, data, since)
+        except Exception as ex:
+            # e.g. the foundation does not support timestamp filters (CF-BadQueryParameter)
+            if self.verbose:
+                print(' Warning. Changes could not be retrieved ({}). Collecting all service instance information...'.format(ex))
+            return self.collectRecords()
 
-        print('Data collection completed.')   
+    def collectIncrementalRecords(self, cfdata, data, since):
+        """
+        Retrieve the resources that were created or updated after since and merge them into the previous result
+        (see collectRecordChanges)
+        """
+        self.high_water_mark = self.getHighWaterMark()
+
+        for name in ['organizations', 'spaces', 'services', 'service_plans']:
+            self.cfdata[name] = dict(cfdata[name])
+
+        # rows of the previous result, keyed by service instance guid
+        service_instances = OrderedDict()
+        records = data if isinstance(data, list) else data[self.SERVICE_INSTANCE_PROPERTIES].to_dict('records')
+        for service in records:
+            service = dict((name, service.get(name)) for name in self.SERVICE_INSTANCE_PROPERTIES)
+            service_instances[service['service_instance_guid']] = service
+
+        listings = [
+            ('organizations', '/v2/organizations', 'organization list', self.addOrganization),
+            ('spaces', '/v2/spaces', 'space list', self.addSpace),
+            ('services', '/v2/services', 'service list', self.addService),
+            ('service_plans', '/v2/service_plans', 'service plan information', self.addServicePlan),
+            ('service_instances', '/v2/service_instances', 'service instance information',
+             lambda resource: service_instances.__setitem__(resource['metadata']['guid'], self.getServiceInstanceProperties(resource)))
+        ]
+
+        for name, url, description, handler in listings:
+            fields = self.getServiceInstanceFields() if name == 'service_instances' else None
+            if self.catalogs is not None and name in self.catalogs:
+                # shared catalog
+                self.cfdata[name] = dict(self.catalogs[name])
+                continue
+            if self.verbose:
+                print('Searching for {} changed since {}...'.format(name.replace('_', ' '), since))
+            with self.metrics.phase(name):
+                # v2 resources that were never updated have no updated_at timestamp
+                for timestamp in ['created_at', 'updated_at']:
+                    self.loadListing('{}?results-per-page=100&q={}>{}'.format(url, timestamp, since), description, handler, fields)
+
+                # detect deletions
+                known = service_instances if name == 'service_instances' else self.cfdata[name]
+                if self.getTotalResults(url, description) != len(known):
+                    if self.verbose:
+                        print(' Reconciling {}...'.format(name.replace('_', ' ')))
+                    known.clear()
+                    self.loadListing('{}?results-per-page=100'.format(url), description, handler, fields)
+
+        # names might have changed
+        for space_guid, space in self.cfdata['spaces'].items():
+            if self.cfdata['organizations'].get(space['org_guid'], space['org_name']) != space['org_name']:
+                self.cfdata['spaces'][space_guid] = dict(space, org_name=self.cfdata['organizations'][space['org_guid']])
+        self.cfdata['service_instances'] = [self.resolveNames(service, warn=False) for service in service_instances.values()]
+
+        if self.verbose:
+            print('Data collection completed.')
+
+        return self.cfdata['service_instances']
+
+    def getServiceInstanceFields(self):
+        """
+        Return the service instance resource fields that are decoded, or None to decode all of them
+        """
+        return self.SERVICE_INSTANCE_FIELDS if self.incremental_decoding else None
 
-        # generate Pandas DataFrame and return it
-        return pd.DataFrame(self.cfdata['service_instances'])
+    def getDataFrame(self, services):
+        """
+        Return a Pandas DataFrame for the specified service instance rows
+        """
+        return toDataFrame(services, compact = self.compact, columns = self.SERVICE_INSTANCE_COLUMNS)
+
+    def internString(self, value):
+        """
+        In compact mode, return the interned (shared) copy of the specified string
+        """
+        if self.compact and isinstance(value, str):
+            return intern(value)
+        return value
+
+    def getHighWaterMark(self):
+        """
+        Return the current time as a Cloud Foundry timestamp, allowing for some clock skew
+        """
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - self.CLOCK_SKEW))
+
+    def loadAllSpaces(self):
+        """
+        Load the spaces of all organizations in cfdata['organizations'] (see spaces_mode)
+        """
+        if self.spaces_mode == 'global':
+            try:
+                self.loadSpaces()
+            except Exception as ex:
+                # some foundations restrict the global listing; fall back to the per-organization listings
+                if self.verbose:
+                    print(' Space list could not be loaded ({}). Searching for spaces by organization...'.format(ex))
+                self.cfdata['spaces'] = {}
+                self.loadSpacesByOrganization()
+        else:
+            self.loadSpacesByOrganization()
+
+    def loadSpaces(self):
+        """
+        Load all spaces that this id has access to using the global (paginated) space listing
+        """
+        # https://apidocs.cloudfoundry.org/280/spaces/list_all_spaces.html
+        if self.verbose:
+            print('Searching for spaces...')
+        self.loadListing('/v2/spaces?results-per-page=100', 'space list', self.addSpace)
+
+    def loadSpacesByOrganization(self):
+        """
+        Load the spaces of each organization in cfdata['organizations'], one organization at a time
+        """
+        # https://apidocs.cloudfoundry.org/280/organizations/list_all_spaces_for_the_organization.html
+        for org_guid in self.cfdata['organizations'].keys():
+            if self.verbose:
+                print(' Searching for spaces in organization {}...'.format(self.cfdata['organizations'][org_guid]))
+            self.loadListing('/v2/organizations/{}/spaces?results-per-page=100'.format(org_guid), 'space list', self.addSpace)
 
+    def addOrganization(self, resource):
+        """
+        Add an organization resource to the organization name lookup map
+        """
+        self.cfdata['organizations'][self.internString(resource['metadata']['guid'])] = self.internString(resource['entity']['name'])
+
+    def addSpace(self, resource):
+        """
+        Add a space resource to the space lookup map (spaces in unknown organizations are ignored)
+        """
+        org_guid = self.internString(resource['entity']['organization_guid'])
+        if org_guid not in self.cfdata['organizations']:
+            return
+        self.cfdata['spaces'][self.internString(resource['metadata']['guid'])] = {
+          'space_name': self.internString(resource['entity']['name']),
+          'org_guid': org_guid,
+          'org_name': self.cfdata['organizations'][org_guid]
+        }
+
+    def addService(self, resource):
+        """
+        Add a service resource to the service name lookup map
+        """
+        self.cfdata['services'][self.internString(resource['metadata']['guid'])] = self.internString(resource['entity']['label'])
+
+    def addServicePlan(self, resource):
+        """
+        Add a service plan resource to the service plan name lookup map
+        """
+        self.cfdata['service_plans'][self.internString(resource['metadata']['guid'])] = self.internString(resource['entity']['name'])
+        self.service_plan_offerings[self.internString(resource['metadata']['guid'])] = self.internString(resource['entity'].get('service_guid'))
+
+    def getServiceInstance(self, resource):
+        """
+        Convert a service instance resource into a row, resolving space, organization, service and service plan names
+        """
+        return self.resolveNames(self.getServiceInstanceProperties(resource))
+
+    def getServiceInstanceProperties(self, resource):
+        """
+        Return the properties of a service instance resource that are stored in a row
+        """
+        return {'service_instance_name':resource['entity']['name'],
+                'service_instance_guid':resource['metadata']['guid'],
+                'service_guid':self.internString(resource['entity']['service_guid']),
+                'created_at':resource['metadata']['created_at'],
+                'service_plan_guid': self.internString(resource['entity'].get('service_plan_guid', None)),
+                'space_guid': self.internString(resource['entity'].get('space_guid', None))}
+
+    def resolveNames(self, service, warn=True):
+        """
+        Add space, organization, service and service plan names to a service instance row
+        """
+        if self.cfdata['spaces'] is not None and self.cfdata['spaces'].get(service['space_guid'], None) is not None:
+            service['space_name'] = self.cfdata['spaces'][service['space_guid']]['space_name']
+            service['org_name'] = self.cfdata['spaces'][service['space_guid']]['org_name']
+            service['org_guid'] = self.cfdata['spaces'][service['space_guid']]['org_guid']
+
+        if self.cfdata['services'] is not None and self.cfdata['services'].get(service['service_guid'], None) is not None:
+            service['service_name'] = self.cfdata['services'][service['service_guid']]
+        else:
+            service['service_name'] = None
+            if warn:
+                print(' Warning. Found no service name for service "{}" guid "{}" in org "{}" space "{}"'.format(service['service_instance_name'],
+                                                                                                                 service['service_guid'],
+                                                                                                                 service.get('org_name'),
+                                                                                                                 service.get('space_name')))
+
+        if self.cfdata['service_plans'] is not None and self.cfdata['service_plans'].get(service['service_plan_guid'], None) is not None:
+            service['service_plan_name'] = self.cfdata['service_plans'][service['service_plan_guid']]
+        else:
+            service['service_plan_name'] = None
+            if warn:
+                print(' Warning. Found no service plan name for service "{}" plan guid "{}" in org "{}" space "{}"'.format(service['service_instance_name'],
+                                                                                                                            service['service_plan_guid'],
+                                                                                                                            service.get('org_name'),
+                                                                                                                            service.get('space_name')))
+        return service
@@ -0,0 +1,148 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+import threading
+import time
+
+from .collector import Collector
+
+
+class CredentialsCache:
+
+    # prefetches for at most this many service instances filter the service key listing by service instance guid
+    # (in chunks, see Collector.getFilteredURLs); larger ones retrieve the global service key listing
+    MAX_FILTERED_GUIDS = 250
+
+    def __init__(self, client, ttl=300, max_concurrency=8):
+        """
+        Caches the service keys (credentials) of service instances for ttl seconds. Service keys can be
+        prefetched in the background for many service instances, using the service key listing filtered by
+        service instance guid or, for large selections, the global service key listing.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.collector = Collector(client=client, max_concurrency=max_concurrency)
+        self.collector.verbose = False
+        self.credentials = {}   # service instance guid -> (timestamp, list of service keys)
+        self.lock = threading.Lock()
+        self.prefetch_thread = None
+        self.prefetch_guids = set()
+        self.prefetch_error = None  # error of the most recent prefetch, if it failed (displayed by the Visualizer)
+
+    def getServiceKey(self, resource):
+        """
+        Convert a service key resource into a dictionary
+        """
+        return {'name': resource['entity']['name'],
+                'credentials': resource['entity']['credentials']}
+
+    def isCached(self, service_instance_guid):
+        """
+        Return True if the service keys of the specified service instance are cached and have not expired
+        """
+        entry = self.credentials.get(service_instance_guid)
+        return entry is not None and entry[0] + self.ttl > time.time()
+
+    def get(self, service_instance_guid):
+        """
+        Return the service keys of the specified service instance, retrieving them if they are not cached
+        """
+        with self.lock:
+            prefetch_thread = self.prefetch_thread
+            prefetching = prefetch_thread is not None and service_instance_guid in self.prefetch_guids
+        if prefetching and not self.isCached(service_instance_guid):
+            # a background prefetch for this service instance is in progress
+            prefetch_thread.join(timeout=30)
+
+        with self.lock:
+            if self.isCached(service_instance_guid):
+                return self.credentials[service_instance_guid][1]
+
+        service_keys = []
+        # https://apidocs.cloudfoundry.org/245/service_instances/list_all_service_keys_for_the_service_instance.html
+        self.collector.loadListing('/v2/service_instances/{}/service_keys?results-per-page=100'.format(service_instance_guid),
+                                   'service key information',
+                                   lambda resource: service_keys.append(self.getServiceKey(resource)))
+        with self.lock:
+            self.credentials[service_instance_guid] = (time.time(), service_keys)
+        return service_keys
+
+    def prefetch(self, service_instance_guids, background=True):
+        """
+        Retrieve the service keys of the specified service instances (unless they are cached) using the service
+        key listing. Returns immediately if background is True. Returns False if the service keys were
+        not retrieved because another prefetch is in progress.
+        """
+        with self.lock:
+            if self.prefetch_thread is not None:
+                # a prefetch is already in progress
+                return False
+            guids = set([guid for guid in service_instance_guids if not self.isCached(guid)])
+            if len(guids) == 0:
+                return True
+            if background:
+                self.prefetch_guids = guids
+                self.prefetch_thread = threading.Thread(target=self.loadServiceKeys, args=(guids,))
+                self.prefetch_thread.daemon = True
+                self.prefetch_thread.start()
+        if not background:
+            self.loadServiceKeys(guids)
+        return True
+
+    def loadServiceKeys(self, service_instance_guids):
+        """
+        Load the service keys of the specified service instances and cache them. If the global service key
+        listing is used, the service keys of all other service instances in it are cached as well.
+        """
+        try:
+            timestamp = time.time()
+            service_keys = dict((guid, []) for guid in service_instance_guids)
+
+            def add(resource):
+                service_keys.setdefault(resource['entity']['service_instance_guid'], []).append(self.getServiceKey(resource))
+
+            # https://apidocs.cloudfoundry.org/280/service_keys/list_all_service_keys.html
+            url = '/v2/service_keys?results-per-page=100'
+            if len(service_instance_guids) <= self.MAX_FILTERED_GUIDS:
+                urls = self.collector.getFilteredURLs(url, [('service_instance_guid', service_instance_guids)])
+            else:
+                urls = [url]
+            for page in self.collector.iterPages(urls, 'service key information'):
+                for resource in page.get('resources', []):
+                    add(resource)
+            with self.lock:
+                for guid, keys in service_keys.items():
+                    self.credentials[guid] = (timestamp, keys)
+                self.prefetch_error = None
+        except Exception as ex:
+            # prefetches run on a worker thread; printing the error would write to whichever notebook cell is running
+            with self.lock:
+                self.prefetch_error = str(ex)
+        finally:
+            with self.lock:
+                if self.prefetch_thread is threading.current_thread():
+                    self.prefetch_thread = None
+                    self.prefetch_guids = set()
+
+    def invalidate(self, service_instance_guid=None):
+        """
+        Remove the cached service keys of the specified service instance (or of all service instances)
+        """
+        with self.lock:
+            if service_instance_guid is None:
+                self.credentials = {}
+            else:
+                self.credentials.pop(service_instance_guid, None)
@@ -0,0 +1,106 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Decoding of Cloud Foundry API response bodies. Each body is parsed once, using the fastest JSON library
+# that is installed (orjson, ujson or the standard library). If ijson is installed, pages can be decoded
+# incrementally, extracting only the resource fields that are needed.
+
+import json
+
+try:
+    import orjson
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    orjson = None
+    try:
+        import ujson
+        JSON_BACKEND = 'ujson'
+    except ImportError:
+        ujson = None
+        JSON_BACKEND = 'json'
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# top-level properties of a Cloud Foundry v2 listing page
+PAGE_PROPERTIES = ['total_results', 'total_pages', 'prev_url', 'next_url']
+
+
+def loads(content):
+    """
+    Decode a JSON document (bytes or text)
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    if ujson is not None:
+        return ujson.loads(content)
+    return json.loads(content)
+
+
+def decodePage(content, fields=None):
+    """
+    Decode a page of a Cloud Foundry v2 listing. If fields (a dictionary with optional 'metadata' and
+    'entity' lists of scalar property names) is specified, only those properties of each resource are
+    returned and, if ijson is installed, the page is decoded incrementally without building the complete
+    object tree.
+    """
+    if fields is None:
+        return loads(content)
+    if ijson is None:
+        page = loads(content)
+        page['resources'] = [selectFields(resource, fields) for resource in page.get('resources', [])]
+        return page
+    return decodePageIncrementally(content, fields)
+
+
+def selectFields(resource, fields):
+    """
+    Return a copy of a resource that only contains the specified metadata and entity properties
+    """
+    return dict((part, dict((name, resource.get(part, {}).get(name)) for name in fields.get(part, [])))
+                for part in ['metadata', 'entity'])
+
+
+def decodePageIncrementally(content, fields):
+    """
+    Decode a page of a Cloud Foundry v2 listing using ijson, extracting only the page properties and
+    the specified resource fields (see decodePage)
+    """
+    prefixes = {}
+    for part in ['metadata', 'entity']:
+        for name in fields.get(part, []):
+            prefixes['resources.item.{}.{}'.format(part, name)] = (part, name)
+
+    page = {'resources': []}
+    resource = None
+    for prefix, event, value in ijson.parse(content):
+        if prefix == 'resources.item':
+            if event == 'start_map':
+                resource = selectFields({}, fields)
+            elif event == 'end_map':
+                page['resources'].append(resource)
+                resource = None
+        elif prefix in prefixes:
+            if event not in ('start_map', 'start_array', 'end_map', 'end_array', 'map_key'):
+                part, name = prefixes[prefix]
+                resource[part][name] = value
+        elif prefix in PAGE_PROPERTIES:
+            page[prefix] = value
+    return page
@@ -0,0 +1,168 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+# Writers that export service instance rows (including the organization, space, service and service plan
+# names) as they are collected. Parquet and Arrow IPC require pyarrow (pip install cfservices[parquet]).
+
+import json
+
+from .collector import Collector
+
+EXPORT_FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.jsonl': 'jsonl'}
+
+
+def getFormat(path):
+    """
+    Return the export format for the extension of the specified file name
+    """
+    for extension, export_format in EXPORT_FORMATS.items():
+        if path.lower().endswith(extension):
+            return export_format
+    raise Exception('Unknown export format for "{}". Specify one of {}.'.format(path, sorted(set(EXPORT_FORMATS.values()))))
+
+
+def toString(value):
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+class JSONLinesWriter:
+    def __init__(self, output):
+        """
+        Writes service instance rows as JSON Lines (one JSON object per line) to a file name or file object
+        """
+        self.owns_output = not hasattr(output, 'write')
+        self.output = open(output, 'w') if self.owns_output else output
+        self.count = 0
+
+    def write(self, rows):
+        for row in rows:
+            self.output.write(json.dumps(row, default=str) + '\n')
+            self.count += 1
+
+    def close(self):
+        if self.owns_output:
+            self.output.close()
+        else:
+            self.output.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ArrowWriter:
+    def __init__(self, path, export_format='parquet', columns=None, batch_size=10000):
+        """
+        Writes service instance rows to a Parquet or Arrow IPC ('arrow') file in record batches of at most
+        batch_size rows, so that memory usage is bounded regardless of the number of service instances.
+        All columns (by default Collector.SERVICE_INSTANCE_COLUMNS) are stored as strings.
+        """
+        import pyarrow as pa
+
+        if export_format not in ['parquet', 'arrow']:
+            raise Exception('Invalid export format "{}". Specify "parquet" or "arrow".'.format(export_format))
+        self.columns = list(columns or Collector.SERVICE_INSTANCE_COLUMNS)
+        self.schema = pa.schema([(column, pa.string()) for column in self.columns])
+        self.batch_size = batch_size
+        self.buffer = []
+        self.count = 0
+        if export_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        while len(self.buffer) >= self.batch_size:
+            self.flush(self.buffer[:self.batch_size])
+            self.buffer = self.buffer[self.batch_size:]
+
+    def flush(self, rows):
+        import pyarrow as pa
+        arrays = [pa.array([toString(row.get(column)) for row in rows], type=pa.string()) for column in self.columns]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.count += len(rows)
+
+    def close(self):
+        if self.buffer:
+            self.flush(self.buffer)
+            self.buffer = []
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def getWriter(path, export_format=None, columns=None, batch_size=10000):
+    """
+    Return a writer for the specified file name (or, for JSON Lines, file object). The format is derived from the
+    file name extension (.parquet, .arrow/.feather or .jsonl) unless export_format is specified.
+    """
+    export_format = export_format or getFormat(path)
+    if export_format == 'jsonl':
+        return JSONLinesWriter(path)
+    return ArrowWriter(path, export_format=export_format, columns=columns, batch_size=batch_size)
+
+
+def export(collector, path, export_format=None, batch_size=10000):
+    """
+    Collect the service instances and write them to the specified file as each page is retrieved. Returns the
+    number of exported service instances. Collectors that do not support paging (e.g. MultiRegionCollector)
+    are exported once collection has completed.
+    """
+    columns = list(Collector.SERVICE_INSTANCE_COLUMNS)
+    if getattr(collector, 'column', None) is not None:
+        columns.append(collector.column)
+
+    writer = getWriter(path, export_format=export_format, columns=columns, batch_size=batch_size)
+    with writer:
+        if hasattr(collector, 'iterServiceInstancePages'):
+            for services in collector.iterServiceInstancePages():
+                writer.write(services)
+        else:
+            df = collector.collect()
+            writer.write(df.astype(object).where(df.notnull(), None).to_dict('records'))
+    return writer.count
+
+
+def writeArrow(df, path):
+    """
+    Write a DataFrame to an Arrow IPC file (preserving the pandas column types)
+    """
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+def loadArrow(path, memory_map=True, as_data_frame=True):
+    """
+    Load an Arrow IPC file (e.g. written by ArrowWriter or writeArrow). If memory_map is True the file is
+    memory-mapped instead of read, so that only the pages that are accessed are loaded. Returns a Pandas
+    DataFrame, or a pyarrow Table if as_data_frame is False.
+    """
+    import pyarrow as pa
+    source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas() if as_data_frame else table
@@ -0,0 +1,163 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import pandas as pd
+
+# columns that service instances can be filtered by
+FILTER_COLUMNS = ['service_guid', 'service_plan_name', 'org_guid', 'space_guid']
+
+
+def sort_key(name):
+    """
+    Sort filter options by display name (case-insensitive). Missing names are sorted first.
+    """
+    try:
+        return name.lower()
+    except AttributeError:
+        return ''
+
+
+class FilterIndex:
+    def __init__(self, services_df):
+        """
+        Facet index for the service -> service plan -> organization -> space filter hierarchy. The index is
+        built once from the distinct filter combinations in services_df; the (sorted) options of each filter
+        can then be looked up for any combination of parent filter selections without scanning the DataFrame.
+        """
+
+        # display names
+        self.service_names = {}
+        self.service_plan_names = {}
+        self.org_names = {}
+        self.space_names = {}
+
+        # option sets, keyed by the parent filter selections (None = all)
+        plans = {}
+        orgs = {}
+        spaces = {}
+
+        # organization names are not unique across regions
+        show_region = 'region' in services_df.columns and services_df['region'].nunique() > 1
+
+        columns = ['service_guid', 'service_name', 'service_plan_name', 'org_guid', 'org_name', 'space_guid', 'space_name', 'region']
+        combinations = services_df.reindex(columns=columns).drop_duplicates()
+        for service_guid, service_name, plan_name, org_guid, org_name, space_guid, space_name, region in combinations.itertuples(index=False):
+            self.service_names[service_guid] = service_name
+            self.service_plan_names[plan_name] = plan_name
+            self.org_names[org_guid] = '{} ({})'.format(org_name, region) if show_region else org_name
+            self.space_names[space_guid] = space_name
+
+            for s in (service_guid, None):
+                plans.setdefault(s, set()).add(plan_name)
+                for p in (plan_name, None):
+                    orgs.setdefault((s, p), set()).add(org_guid)
+                    for o in (org_guid, None):
+                        spaces.setdefault((s, p, o), set()).add(space_guid)
+
+        # pre-sort all option lists
+        self.services = sorted(self.service_names, key=lambda k: sort_key(self.service_names[k]))
+        self.service_plans = {key: sorted(options, key=lambda k: sort_key(self.service_plan_names[k])) for key, options in plans.items()}
+        self.orgs = {key: sorted(options, key=lambda k: sort_key(self.org_names[k])) for key, options in orgs.items()}
+        self.spaces = {key: sorted(options, key=lambda k: sort_key(self.space_names[k])) for key, options in spaces.items()}
+
+    def getServiceOptions(self):
+        """
+        Return the sorted list of service guids
+        """
+        return self.services
+
+    def getServicePlanOptions(self, service_guid=None):
+        """
+        Return the sorted list of service plan names for the selected service
+        """
+        return self.service_plans.get(service_guid, [])
+
+    def getOrgOptions(self, service_guid=None, service_plan_name=None):
+        """
+        Return the sorted list of organization guids for the selected service and service plan
+        """
+        return self.orgs.get((service_guid, service_plan_name), [])
+
+    def getSpaceOptions(self, service_guid=None, service_plan_name=None, org_guid=None):
+        """
+        Return the sorted list of space guids for the selected service, service plan and organization
+        """
+        return self.spaces.get((service_guid, service_plan_name, org_guid), [])
+
+
+class ServiceInstanceFilter:
+    def __init__(self, services_df, cache_size=32):
+        """
+        Returns the service instances in services_df (sorted by name) that match a filter selection. The
+        DataFrame is sorted once and the filter columns are encoded as categoricals, so that a filter is a
+        few vectorized comparisons of category codes. The most recently used cache_size results are cached.
+        services_df is not modified.
+        """
+        self.services_df = services_df.sort_values(by=['service_instance_name']).reset_index(drop=True)
+        self.categoricals = {column: pd.Categorical(self.services_df[column]) for column in FILTER_COLUMNS}
+        self.sort_ranks = {}
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def getMatches(self, service_guid=None, service_plan_name=None, org_guid=None, space_guid=None, sort_by='service_instance_name'):
+        """
+        Return a DataFrame containing the service instances that match the filter selection (None = all),
+        sorted by the sort_by column (and service instance name)
+        """
+        key = (service_guid, service_plan_name, org_guid, space_guid, sort_by)
+        with self.lock:
+            if key in self.cache:
+                # mark as most recently used
+                self.cache[key] = self.cache.pop(key)
+                return self.cache[key]
+
+        mask = None
+        for column, value in zip(FILTER_COLUMNS, key[:4]):
+            if value is None:
+                continue
+            categories = self.categoricals[column].categories
+            if value in categories:
+                column_mask = self.categoricals[column].codes == categories.get_loc(value)
+            else:
+                column_mask = np.zeros(len(self.services_df), dtype=bool)
+            mask = column_mask if mask is None else mask & column_mask
+
+        matches = self.services_df if mask is None else self.services_df[mask]
+        if sort_by != 'service_instance_name':
+            # stable sort, preserving the name order within each group
+            ranks = self.getSortRanks(sort_by)
+            matches = matches.iloc[np.argsort(ranks if mask is None else ranks[mask], kind='mergesort')]
+
+        with self.lock:
+            self.cache[key] = matches
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return matches
+
+    def getSortRanks(self, column):
+        """
+        Return the (case-insensitive) sort rank of each row for the specified column
+        """
+        with self.lock:
+            if column not in self.sort_ranks:
+                # categories are sorted, so category codes are ranks
+                self.sort_ranks[column] = pd.Categorical(self.services_df[column].astype(object).fillna('').astype(str).str.lower()).codes
+            return self.sort_ranks[column]
@@ -0,0 +1,91 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+from collections import OrderedDict
+
+# Pandas is imported when it is needed; the Collector core works with plain rows (dictionaries)
+
+# low-cardinality columns of the service instance DataFrame
+CATEGORICAL_COLUMNS = ['org_guid', 'org_name',
+                       'space_guid', 'space_name',
+                       'service_guid', 'service_name',
+                       'service_plan_guid', 'service_plan_name',
+                       'region', 'identity']
+
+
+def toDataFrame(records, compact=False, columns=None):
+    """
+    Return a Pandas DataFrame for a list of service instance rows (see toCompactDataFrame for compact). If there
+    are no rows, the DataFrame has the specified columns.
+    """
+    import pandas as pd
+    df = pd.DataFrame(records) if len(records) > 0 else pd.DataFrame(columns=columns)
+    if compact:
+        df = toCompactDataFrame(df)
+    return df
+
+
+def toColumns(records, columns):
+    """
+    Return a column-oriented representation (dictionary of column names and value lists) of a list of service instance rows
+    """
+    return OrderedDict((column, [record.get(column) for record in records]) for column in columns)
+
+
+def toCompactDataFrame(df):
+    """
+    Return a compact copy of a service instance DataFrame: low-cardinality columns are stored as
+    categoricals and created_at is parsed into a datetime64 column
+    """
+    import pandas as pd
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    if 'created_at' in df.columns:
+        df['created_at'] = pd.to_datetime(df['created_at'], utc=True)
+    return df
+
+
+def fillna(df, value):
+    """
+    Like DataFrame.fillna(value=value), but also works for categorical columns
+    """
+    import pandas as pd
+    df = df.copy()
+    for column, fill_value in value.items():
+        if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype) and fill_value not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories([fill_value])
+    return df.fillna(value=value)
+
+
+def getMemoryReport(df):
+    """
+    Return a DataFrame comparing the (deep) memory usage in bytes of each column of a service instance
+    DataFrame in standard and in compact representation
+    """
+    import pandas as pd
+    standard_df = df.copy()
+    for column in standard_df.columns:
+        if isinstance(standard_df[column].dtype, pd.CategoricalDtype) or column == 'created_at':
+            standard_df[column] = standard_df[column].astype(str).where(standard_df[column].notnull(), None)
+    compact_df = toCompactDataFrame(standard_df)
+
+    report = pd.DataFrame({'standard': standard_df.memory_usage(index=False, deep=True),
+                           'compact': compact_df.memory_usage(index=False, deep=True)})
+    report.loc['total'] = report.sum()
+    report['ratio'] = (report['compact'] / report['standard']).round(3)
+    return report
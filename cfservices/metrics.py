@@ -0,0 +1,185 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+# Cloud Foundry guids in API paths, e.g. /v2/service_instances/<guid>/service_keys
+GUID_PATTERN = re.compile(r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)')
+
+
+def getURLTemplate(url):
+    """
+    Return the URL template of an API path by removing the query string and replacing guids,
+    e.g. '/v2/service_instances/<guid>/service_keys?page=2' -> '/v2/service_instances/{guid}/service_keys'
+    """
+    return GUID_PATTERN.sub('/{guid}', url.split('?', 1)[0])
+
+
+class Metrics:
+    def __init__(self, max_events=10000):
+        """
+        Records an event for each API request (URL template, latency, status, bytes, retries) and the duration
+        of each data collection phase (organizations, spaces, services, service plans, service instances).
+        The most recent max_events events are kept. Callbacks are invoked with each event as it is recorded.
+        """
+        self.events = deque(maxlen=max_events)
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all recorded events and statistics
+        """
+        with self.lock:
+            self.events.clear()
+            self.requests = OrderedDict()   # (method, URL template) -> statistics
+            self.phases = OrderedDict()     # phase name -> statistics
+
+    def addCallback(self, callback):
+        """
+        Invoke callback(event) for each request and phase event. Events are dictionaries; their type is 'request' or 'phase'.
+        """
+        self.callbacks.append(callback)
+
+    def removeCallback(self, callback):
+        self.callbacks.remove(callback)
+
+    def recordRequest(self, method, url, status, latency, size, retries=0):
+        """
+        Record an API request. url is the API path (e.g. '/v2/organizations?page=2'), status the HTTP status
+        code (None if no response was received), latency the duration in seconds and size the response size in bytes.
+        Only the final status of a request is recorded (and counted in statuses): intermediate 429 and 5xx
+        responses that were retried only show up in retries.
+        """
+        event = {'type': 'request',
+                 'timestamp': time.time(),
+                 'method': method,
+                 'url_template': getURLTemplate(url),
+                 'status': status,
+                 'latency': latency,
+                 'bytes': size,
+                 'retries': retries}
+        with self.lock:
+            self.events.append(event)
+            stats = self.requests.setdefault((method, event['url_template']), {'count': 0, 'errors': 0, 'retries': 0, 'bytes': 0,
+                                                                              'latency': 0.0, 'max_latency': 0.0,
+                                                                              'statuses': {}})
+            stats['count'] += 1
+            stats['retries'] += retries
+            stats['bytes'] += size or 0
+            stats['latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+        self.notify(event)
+
+    def recordPhase(self, name, duration):
+        """
+        Record the duration in seconds of a data collection phase
+        """
+        event = {'type': 'phase',
+                 'timestamp': time.time(),
+                 'phase': name,
+                 'duration': duration}
+        with self.lock:
+            self.events.append(event)
+            stats = self.phases.setdefault(name, {'count': 0, 'duration': 0.0})
+            stats['count'] += 1
+            stats['duration'] += duration
+        self.notify(event)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager that records the duration of a data collection phase
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.recordPhase(name, time.time() - start)
+
+    def notify(self, event):
+        for callback in list(self.callbacks):
+            try:
+                callback(event)
+            except Exception as ex:
+                print(' Warning. Metrics callback failed: {}'.format(ex))
+
+    def getSummary(self):
+        """
+        Return a dictionary summarizing the recorded requests (in total and by URL template) and phases
+        """
+        with self.lock:
+            requests = []
+            for (method, url_template), stats in self.requests.items():
+                requests.append(dict(stats,
+                                     method=method,
+                                     url_template=url_template,
+                                     statuses=dict(stats['statuses']),
+                                     mean_latency=stats['latency'] / stats['count']))
+            phases = [dict(stats, phase=name) for name, stats in self.phases.items()]
+
+        return {'requests': sum(stats['count'] for stats in requests),
+                'errors': sum(stats['errors'] for stats in requests),
+                'retries': sum(stats['retries'] for stats in requests),
+                'bytes': sum(stats['bytes'] for stats in requests),
+                'latency': sum(stats['latency'] for stats in requests),
+                'by_url_template': sorted(requests, key=lambda stats: stats['latency'], reverse=True),
+                'phases': phases}
+
+    def toOpenMetrics(self, prefix='cfservices'):
+        """
+        Return the recorded statistics in Prometheus / OpenMetrics text exposition format
+        """
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        summary = self.getSummary()
+        lines = []
+
+        def family(name, metric_type, description, samples):
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, metric_type))
+            lines.append('# HELP {}_{} {}'.format(prefix, name, description))
+            for suffix, labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(key, escape(label)) for key, label in labels)
+                lines.append('{}_{}{}{} {}'.format(prefix, name, suffix, '{' + label_text + '}' if label_text else '', value))
+
+        family('requests', 'counter', 'Cloud Foundry API requests.',
+               [('_total', [('method', stats['method']), ('url_template', stats['url_template']), ('status', status)], count)
+                for stats in summary['by_url_template'] for status, count in sorted(stats['statuses'].items(), key=lambda item: str(item[0]))])
+        family('request_retries', 'counter', 'Retried Cloud Foundry API requests.',
+               [('_total', [('method', stats['method']), ('url_template', stats['url_template'])], stats['retries'])
+                for stats in summary['by_url_template']])
+        family('response_bytes', 'counter', 'Size of the Cloud Foundry API responses.',
+               [('_total', [('method', stats['method']), ('url_template', stats['url_template'])], stats['bytes'])
+                for stats in summary['by_url_template']])
+        family('request_duration_seconds', 'summary', 'Latency of the Cloud Foundry API requests.',
+               [sample for stats in summary['by_url_template']
+                for sample in [('_count', [('method', stats['method']), ('url_template', stats['url_template'])], stats['count']),
+                               ('_sum', [('method', stats['method']), ('url_template', stats['url_template'])], stats['latency'])]])
+        family('phase_duration_seconds', 'summary', 'Duration of the data collection phases.',
+               [sample for stats in summary['phases']
+                for sample in [('_count', [('phase', stats['phase'])], stats['count']),
+                               ('_sum', [('phase', stats['phase'])], stats['duration'])]])
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,225 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+
+from .client import Client
+from .collector import Collector
+from .frames import toCompactDataFrame
+
+# Cloud Foundry API endpoints of the IBM Cloud regions
+REGIONS = OrderedDict([
+    ('us-south', 'https://api.ng.bluemix.net{}'),
+    ('eu-gb', 'https://api.eu-gb.bluemix.net{}'),
+    ('eu-de', 'https://api.eu-de.bluemix.net{}'),
+    ('au-syd', 'https://api.au-syd.bluemix.net{}')
+])
+
+
+def getEndpoints(api_endpoints):
+    """
+    Normalize a list of region names (see REGIONS) or API endpoint URLs, or a dictionary of region names
+    and API endpoint URLs, into an ordered dictionary of region names and endpoint URL templates
+    """
+    if isinstance(api_endpoints, dict):
+        items = list(api_endpoints.items())
+    else:
+        items = [(None, endpoint) for endpoint in api_endpoints]
+
+    endpoints = OrderedDict()
+    for region, endpoint in items:
+        if endpoint in REGIONS:
+            region = region or endpoint
+            endpoint = REGIONS[endpoint]
+        if '{}' not in endpoint:
+            endpoint = endpoint.rstrip('/') + '{}'
+        if region is None:
+            # e.g. 'https://api.eu-gb.bluemix.net{}' -> 'api.eu-gb.bluemix.net'
+            region = endpoint.replace('{}', '').split('://')[-1]
+        endpoints[region] = endpoint
+    return endpoints
+
+
+def createClients(arguments, max_workers=None):
+    """
+    Create a client for each entry of an ordered dictionary of names and Client keyword arguments concurrently,
+    so that their access tokens are obtained at the same time. Returns an ordered dictionary of names and clients.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(arguments)) as executor:
+        futures = OrderedDict((name, executor.submit(lambda kwargs: Client(**kwargs), kwargs)) for name, kwargs in arguments.items())
+        return OrderedDict((name, future.result()) for name, future in futures.items())
+
+
+class MultiRegionCollector:
+
+    # name of the column that identifies the client of each row
+    column = 'region'
+
+    def __init__(self, ibm_cloud_user_api_token=None, ibmid=None, password=None, api_endpoints=None, clients=None, max_workers=None, **kwargs):
+        """
+        Collects service instance information from multiple Cloud Foundry API endpoints (regions) concurrently.
+        api_endpoints is a list of region names (see REGIONS) or API endpoint URLs, or a dictionary of region
+        names and API endpoint URLs. Alternatively a dictionary of region names and clients can be specified.
+        The collected information is returned as one DataFrame with an additional region column. At most
+        max_workers regions (default: all) are crawled at the same time.
+        """
+
+        if clients is None:
+            if api_endpoints is None or len(api_endpoints) == 0:
+                raise Exception('You must specify one or more Cloud Foundry API endpoints.')
+            arguments = OrderedDict()
+            for region, endpoint in getEndpoints(api_endpoints).items():
+                arguments[region] = dict(kwargs,
+                                         ibm_cloud_user_api_token = ibm_cloud_user_api_token,
+                                         ibmid = ibmid,
+                                         password = password,
+                                         api_base_url = endpoint)
+            clients = createClients(arguments, max_workers)
+        self.clients = clients
+
+        self.collectors = OrderedDict((region, Collector(client = client, **kwargs)) for region, client in self.clients.items())
+
+        self.max_workers = max_workers or len(self.collectors)
+
+        self.cfdata = OrderedDict()
+        self.high_water_mark = None
+
+    def getCacheKey(self):
+        """
+        Return a key that identifies the API endpoints, user and scope of this collector (without revealing the secret)
+        """
+        keys = ['{}={}'.format(region, collector.getCacheKey()) for region, collector in self.collectors.items()]
+        return hashlib.sha256('\n'.join(keys).encode('utf-8')).hexdigest()
+
+    def collect(self):
+        """
+        Collect information about Cloud Foundry service instances in all regions. Returns a Pandas DataFrame.
+        """
+        return self.run(lambda region, collector: collector.collect())
+
+    def collectChanges(self, cfdata, data, since):
+        """
+        Incrementally update previously collected information in all regions (see Collector.collectChanges)
+        """
+        def collectChanges(region, collector):
+            if region not in cfdata:
+                return collector.collect()
+            return collector.collectChanges(cfdata[region], data[data[self.column] == region].drop(columns=[self.column]), since)
+
+        return self.run(collectChanges)
+
+    def run(self, collect):
+        """
+        Invoke collect(region, collector) for each region concurrently and combine the results
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = OrderedDict((region, executor.submit(collect, region, collector)) for region, collector in self.collectors.items())
+            results = OrderedDict((region, future.result()) for region, future in futures.items())
+
+        frames = []
+        for region, df in results.items():
+            frames.append(df.assign(**{self.column: region}))
+            # the lookup maps of each region; the service instances are part of the DataFrame
+            self.cfdata[region] = dict((name, value) for name, value in self.collectors[region].cfdata.items() if name != 'service_instances')
+
+        self.high_water_mark = min(collector.high_water_mark for collector in self.collectors.values())
+
+        import pandas as pd
+        df = pd.concat(frames, ignore_index=True)
+        if any(collector.compact for collector in self.collectors.values()):
+            # categories differ between regions
+            df = toCompactDataFrame(df)
+        return df
+
+
+class MultiAccountCollector(MultiRegionCollector):
+
+    column = 'identity'
+
+    def __init__(self, api_keys=None, api_base_url='https://api.ng.bluemix.net{}', clients=None, max_workers=4, **kwargs):
+        """
+        Collects service instance information for multiple IBM Cloud identities (accounts) in a worker pool of
+        max_workers threads. Each identity is crawled with at most max_concurrency requests in flight. api_keys
+        is a list of IBM Cloud user API keys or a dictionary of identity labels and API keys. Alternatively a
+        dictionary of identity labels and clients can be specified. The service and service plan catalogs are
+        retrieved once and shared. Service instances that are visible to more than one identity are only
+        returned once, tagged (identity column) with the first identity (in api_keys order) that can see them.
+        That identity might not be able to read their service keys (e.g. a space auditor); the Visualizer
+        then tries the other identities.
+        """
+
+        if clients is None:
+            if api_keys is None or len(api_keys) == 0:
+                raise Exception('You must specify one or more IBM Cloud user API keys.')
+            if not isinstance(api_keys, dict):
+                api_keys = OrderedDict(('key{}'.format(index + 1), api_key) for index, api_key in enumerate(api_keys))
+            arguments = OrderedDict()
+            for identity, api_key in api_keys.items():
+                arguments[identity] = dict(kwargs,
+                                           ibm_cloud_user_api_token = api_key,
+                                           api_base_url = api_base_url)
+            clients = createClients(arguments, max_workers)
+
+        MultiRegionCollector.__init__(self, clients = clients, max_workers = max_workers, **kwargs)
+
+    def loadCatalogs(self):
+        """
+        Load the (not user specific) service and service plan catalogs once, using the first identity, and
+        share them with the collectors of all identities
+        """
+        collector = list(self.collectors.values())[0]
+        collector.catalogs = None
+        catalogs = collector.loadCatalogs()
+        for collector in self.collectors.values():
+            collector.catalogs = catalogs
+
+    def collect(self):
+        """
+        Collect information about Cloud Foundry service instances for all identities. Returns a Pandas DataFrame.
+        """
+        self.loadCatalogs()
+        return MultiRegionCollector.collect(self)
+
+    def collectChanges(self, cfdata, data, since):
+        """
+        Incrementally update previously collected information for all identities (see Collector.collectChanges).
+        Each identity is updated with all service instances that it can see, including those that were tagged
+        with another identity, so that they match its Cloud Foundry listings.
+        """
+        self.loadCatalogs()
+
+        def collectChanges(identity, collector):
+            lookup_data = cfdata.get(identity)
+            if lookup_data is None or lookup_data.get('service_instance_guids') is None:
+                return collector.collect()
+            service_instances = data[data['service_instance_guid'].isin(lookup_data['service_instance_guids'])].drop(columns=[self.column])
+            return collector.collectChanges(dict((name, value) for name, value in lookup_data.items() if name != 'service_instance_guids'),
+                                            service_instances,
+                                            since)
+
+        return self.run(collectChanges)
+
+    def run(self, collect):
+        """
+        Invoke collect(identity, collector) for each identity in the worker pool and combine the de-duplicated results
+        """
+        df = MultiRegionCollector.run(self, collect)
+        # the service instances that each identity can see are needed to update it incrementally (see collectChanges)
+        for identity, collector in self.collectors.items():
+            self.cfdata[identity]['service_instance_guids'] = [service['service_instance_guid'] for service in collector.cfdata['service_instances']]
+        return df.drop_duplicates(subset=['service_instance_guid'], keep='first').reset_index(drop=True)
@@ -0,0 +1,155 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+from contextlib import contextmanager
+from email.utils import parsedate_tz, mktime_tz
+import random
+import threading
+import time
+
+# responses that indicate that the API is overloaded or rate limiting this id
+THROTTLE_STATUSES = (429, 503)
+
+# responses that are worth retrying (for idempotent requests)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def getRetryAfter(response):
+    """
+    Return the number of seconds specified by the Retry-After header of the response (delay-seconds or
+    HTTP-date), or None
+    """
+    value = response.headers.get('retry-after') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_limit=8, min_limit=1, decrease_factor=0.5, cooldown=1.0):
+        """
+        AIMD (additive increase, multiplicative decrease) limit on the number of requests in flight. The limit
+        grows by one after a limit's worth of successful requests and is multiplied by decrease_factor when the
+        API pushes back (at most once per cooldown seconds, because concurrent requests are throttled together).
+        """
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.successes = 0
+        self.last_decrease = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Context manager that waits until another request may be issued
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def onSuccess(self):
+        """
+        Additive increase
+        """
+        with self.condition:
+            self.successes += 1
+            if self.successes >= int(self.limit) and self.limit < self.max_limit:
+                self.successes = 0
+                self.limit = min(self.max_limit, self.limit + 1)
+                self.condition.notify_all()
+
+    def onThrottle(self):
+        """
+        Multiplicative decrease
+        """
+        with self.condition:
+            now = time.time()
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.successes = 0
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+    def getLimit(self):
+        return int(self.limit)
+
+
+class RequestPolicy:
+    def __init__(self, max_retries=5, backoff_base=0.5, backoff_max=30, max_retry_after=120, max_concurrency=8, min_concurrency=1):
+        """
+        Retry and rate limiting policy for Cloud Foundry API requests, shared by all threads that use a client.
+        Idempotent requests that fail with a transient error (connection error, 429, 5xx) are retried up to
+        max_retries times, waiting for the Retry-After period (up to max_retry_after seconds) or an exponential
+        backoff with full jitter (backoff_base * 2^attempt, at most backoff_max seconds). The number of requests
+        in flight is limited to between min_concurrency and max_concurrency (see ConcurrencyLimiter).
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.limiter = ConcurrencyLimiter(max_limit = max_concurrency, min_limit = min_concurrency)
+
+    def isRetryable(self, method, attempt, status=None):
+        """
+        Return True if a request that failed with status (None = no response) should be retried
+        """
+        if method.upper() not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+            return False
+        return status is None or status in RETRY_STATUSES
+
+    def getDelay(self, attempt, response=None):
+        """
+        Return the number of seconds to wait before the next attempt
+        """
+        retry_after = getRetryAfter(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def onResponse(self, status):
+        """
+        Adjust the concurrency limit based on the response status (None = no response)
+        """
+        if status in THROTTLE_STATUSES:
+            self.limiter.onThrottle()
+        elif status is not None and status < 500:
+            self.limiter.onSuccess()
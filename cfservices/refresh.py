@@ -0,0 +1,152 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+import threading
+import time
+
+# the refreshers whose worker threads are running, keyed by collector cache key (see InventoryRefresher.start)
+running_refreshers = {}
+running_refreshers_lock = threading.Lock()
+
+
+class InventoryRefresher:
+    def __init__(self, collector, data, cfdata=None, high_water_mark=None, interval=None, snapshot_store=None, updated_at=None):
+        """
+        Collects the service instance information of a collector again on a worker thread, every interval seconds
+        (None = only when refresh() is called). data, cfdata and high_water_mark are the results of the previous
+        collection; if they are known, only what has changed is retrieved (see Collector.collectChanges). Each new
+        result is kept until it is picked up with getUpdate(). If a snapshot_store is specified, it is also saved.
+        """
+        self.collector = collector
+        self.data = data
+        self.cfdata = cfdata
+        self.high_water_mark = high_water_mark
+        self.interval = interval
+        self.snapshot_store = snapshot_store
+        self.updated_at = updated_at or time.time()
+        self.refreshing = False
+        self.error = None
+        self.update = None
+        self.prepare = None
+        self.lock = threading.Lock()
+        self.requested = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def start(self, prepare=None):
+        """
+        Start the worker thread (unless it is running). prepare(data) is invoked on the worker thread for each new
+        result (e.g. to pre-compute indexes); its return value is included in the update (see getUpdate). The worker
+        thread of a previously started refresher for the same endpoint and user (e.g. of an app that was run again)
+        is stopped.
+        """
+        key = self.collector.getCacheKey()
+        with running_refreshers_lock:
+            previous = running_refreshers.get(key)
+            running_refreshers[key] = self
+        if previous is not None and previous is not self:
+            previous.stop()
+
+        with self.lock:
+            self.prepare = prepare
+            self.stopped = False
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread (once the current collection, if any, has completed). Returns immediately.
+        """
+        with self.lock:
+            self.stopped = True
+        self.requested.set()
+        key = self.collector.getCacheKey()
+        with running_refreshers_lock:
+            if running_refreshers.get(key) is self:
+                del running_refreshers[key]
+
+    def refresh(self):
+        """
+        Collect the service instance information again as soon as possible. Returns immediately.
+        """
+        with self.lock:
+            self.refreshing = True
+        self.requested.set()
+
+    def run(self):
+        while True:
+            self.requested.wait(self.interval)
+            self.requested.clear()
+            with self.lock:
+                if self.stopped:
+                    return
+            self.collect()
+
+    def collect(self):
+        """
+        Collect the service instance information (incrementally if possible) and store the result as an update
+        """
+        with self.lock:
+            self.refreshing = True
+            cfdata = self.cfdata
+            data = self.data
+            since = self.high_water_mark
+            prepare = self.prepare
+
+        # progress information would be printed to whichever notebook cell is running
+        for collector in [self.collector] + list(getattr(self.collector, 'collectors', {}).values()):
+            if hasattr(collector, 'verbose'):
+                collector.verbose = False
+
+        try:
+            if cfdata is not None and since is not None:
+                data = self.collector.collectChanges(cfdata, data, since)
+            else:
+                data = self.collector.collect()
+            # the collector replaces (rather than modifies) the lookup maps when it collects again
+            cfdata = dict(self.collector.cfdata)
+            high_water_mark = self.collector.high_water_mark
+            if self.snapshot_store is not None:
+                self.snapshot_store.save(self.collector.getCacheKey(), cfdata, data, high_water_mark = high_water_mark)
+            prepared = prepare(data) if prepare is not None else None
+        except Exception as ex:
+            # shown by the app (see Visualizer.display_refresh_status); printing it would write to whichever cell is running
+            with self.lock:
+                self.error = str(ex)
+                self.refreshing = False
+            return
+
+        with self.lock:
+            self.data = data
+            self.cfdata = cfdata
+            self.high_water_mark = high_water_mark
+            self.updated_at = time.time()
+            self.update = {'data': data, 'prepared': prepared, 'updated_at': self.updated_at}
+            self.error = None
+            self.refreshing = False
+
+    def getUpdate(self):
+        """
+        Return the most recent result that has not been picked up yet (a dictionary with data, prepared and
+        updated_at), or None
+        """
+        with self.lock:
+            update = self.update
+            self.update = None
+        return update
@@ -0,0 +1,121 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+import json
+import os
+import time
+
+import pandas as pd
+
+from .export import loadArrow, writeArrow
+
+
+# data file name extension of each snapshot format
+DATA_FILE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+class SnapshotStore:
+    def __init__(self, directory='~/.cfservices/snapshots', ttl=3600, data_format='parquet', memory_map=True):
+        """
+        On-disk store for collected service instance information. A snapshot consists of the cfdata
+        lookup maps (stored as JSON) and the service instance DataFrame (stored as Parquet or, if data_format
+        is 'arrow', as Arrow IPC file). Requires pyarrow. Arrow snapshots are memory-mapped when they are
+        loaded, unless memory_map is False. Snapshots are keyed by API endpoint and identity and expire after ttl seconds.
+        """
+        if data_format not in ['parquet', 'arrow']:
+            raise Exception('Invalid snapshot data_format "{}". Specify "parquet" or "arrow".'.format(data_format))
+        try:
+            import pyarrow
+        except ImportError:
+            raise Exception('Snapshots require pyarrow. Install it using pip install cfservices[parquet].')
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.ttl = ttl
+        self.data_format = data_format
+        self.memory_map = memory_map
+
+    def getPaths(self, key, data_format='parquet'):
+        """
+        Return the metadata file and data file names for the specified snapshot key
+        """
+        return os.path.join(self.directory, key + '.json'), os.path.join(self.directory, key + DATA_FILE_EXTENSIONS[data_format])
+
+    def load(self, key, include_expired=False):
+        """
+        Return the snapshot (a dictionary with keys 'created_at', 'expired', 'cfdata' and 'data') that is stored
+        under the specified key, or None if no snapshot exists or the snapshot has expired. Expired snapshots
+        are returned if include_expired is True (e.g. to update them incrementally).
+        """
+        metadata_file = self.getPaths(key)[0]
+        if not os.path.exists(metadata_file):
+            return None
+        try:
+            with open(metadata_file, 'r') as f:
+                snapshot = json.load(f)
+            if snapshot.get('format') not in DATA_FILE_EXTENSIONS:
+                raise Exception('unsupported format "{}"'.format(snapshot.get('format')))
+            data_file = self.getPaths(key, snapshot['format'])[1]
+            snapshot['expired'] = self.ttl is not None and snapshot['created_at'] + self.ttl < time.time()
+            if snapshot['expired'] and not include_expired:
+                return None
+            if snapshot['format'] == 'arrow':
+                snapshot['data'] = loadArrow(data_file, memory_map = self.memory_map)
+            else:
+                snapshot['data'] = pd.read_parquet(data_file, engine='pyarrow')
+            return snapshot
+        except Exception as ex:
+            print(' Warning. Ignoring snapshot "{}": {}'.format(metadata_file, ex))
+            return None
+
+    def save(self, key, cfdata, data, **kwargs):
+        """
+        Store the cfdata lookup maps and the service instance DataFrame under the specified key. Additional
+        keyword arguments are stored in the snapshot metadata.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, 0o700)
+        metadata_file, data_file = self.getPaths(key, self.data_format)
+        snapshot = dict(kwargs)
+        snapshot['created_at'] = time.time()
+        # the service instances are stored in the DataFrame
+        snapshot['cfdata'] = dict((name, value) for name, value in cfdata.items() if name != 'service_instances')
+        # like the metadata file, the data file (names of organizations, spaces and service instances) is only
+        # readable by the current user, regardless of the umask
+        os.close(os.open(data_file + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+        os.chmod(data_file + '.tmp', 0o600)
+        if self.data_format == 'arrow':
+            writeArrow(data, data_file + '.tmp')
+        else:
+            data.to_parquet(data_file + '.tmp', index=False, engine='pyarrow')
+        os.chmod(data_file + '.tmp', 0o600)
+        snapshot['format'] = self.data_format
+        replace = getattr(os, 'replace', os.rename)
+        replace(data_file + '.tmp', data_file)
+        # the metadata file is written last; a snapshot without one is ignored
+        fd = os.open(metadata_file + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        replace(metadata_file + '.tmp', metadata_file)
+
+    def invalidate(self, key):
+        """
+        Remove the snapshot that is stored under the specified key
+        """
+        paths = set()
+        for data_format in DATA_FILE_EXTENSIONS:
+            paths.update(self.getPaths(key, data_format))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,219 @@
+# -------------------------------------------------------------------------------
+# Copyright IBM Corp. 2017
+# 
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+# http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -------------------------------------------------------------------------------
+
+import binascii
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class TokenManager:
+
+    # PBKDF2 iterations of the salted secret hashes that are stored with the tokens
+    SECRET_HASH_ITERATIONS = 100000
+
+    def __init__(self, cache_file=None, refresh_margin=120):
+        """
+        Thread-safe cache of Cloud Foundry access tokens, keyed by API endpoint and user. Tokens are
+        refreshed (using the refresh token grant) refresh_margin seconds before they expire. If cache_file
+        is specified tokens are also persisted in this file, which is only readable by the current user.
+        """
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.tokens = {}
+        self.lock = threading.RLock()     # guards tokens and key_locks; not held while tokens are requested
+        self.key_locks = {}               # cache key -> lock that serializes the token requests of one user
+        self.verified = set()             # (secret hash, sha256 of salt and secret) pairs that were checked
+        self.loaded = False
+
+    def getKey(self, api_base_url, id, password):
+        """
+        Return the cache key for the specified endpoint and user. Keys are also used as snapshot file names, so
+        passwords are not part of them: IBMid logins are keyed by endpoint and IBMid. API keys (id 'apikey') are
+        random secrets that identify the user; they are only included as part of a hash. Cached tokens are only
+        returned for the password or API key they were obtained with (see checkSecret).
+        """
+        if id != 'apikey':
+            return hashlib.sha256(u'{}\n{}'.format(api_base_url, id).encode('utf-8')).hexdigest()
+        return hashlib.sha256(u'{}\n{}\n{}'.format(api_base_url, id, password).encode('utf-8')).hexdigest()
+
+    def hashSecret(self, password, salt):
+        """
+        Return the salted (slow) hash of a password or API key that is stored with its tokens
+        """
+        return binascii.hexlify(hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), binascii.unhexlify(salt),
+                                                    self.SECRET_HASH_ITERATIONS)).decode('ascii')
+
+    def checkSecret(self, entry, password):
+        """
+        Return True if the token entry was obtained with the specified password or API key. Cache keys of IBMid
+        logins do not include the password, so a cached token must not be returned for a different one.
+        """
+        if entry is None or entry.get('secret_salt') is None or entry.get('secret_hash') is None:
+            return False
+        verified = (entry['secret_hash'], hashlib.sha256((entry['secret_salt'] + password).encode('utf-8')).hexdigest())
+        if verified in self.verified:
+            return True
+        if self.hashSecret(password, entry['secret_salt']) != entry['secret_hash']:
+            return False
+        self.verified.add(verified)
+        return True
+
+    def getCachedToken(self, key, password):
+        """
+        Return the cached access token (including type) for the specified key if it is still valid and was
+        obtained with the specified password or API key, or None
+        """
+        with self.lock:
+            self.load()
+            entry = self.tokens.get(key)
+            if entry is not None and entry['expires_at'] - self.refresh_margin > time.time() and self.checkSecret(entry, password):
+                return entry['token_type'] + ' ' + entry['access_token']
+            return None
+
+    def getToken(self, session, api_base_url, id, password):
+        """
+        Return a valid access token (including type, e.g. "Bearer 012345") for the specified endpoint and user,
+        minting or refreshing it if necessary. Only requests for the same endpoint and user wait for each other.
+        """
+        key = self.getKey(api_base_url, id, password)
+        token = self.getCachedToken(key, password)
+        if token is not None:
+            return token
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # another thread might have obtained a token in the meantime
+            token = self.getCachedToken(key, password)
+            if token is not None:
+                return token
+            with self.lock:
+                entry = self.tokens.get(key)
+                if not self.checkSecret(entry, password):
+                    # never refresh a token that was obtained with another password; the password grant checks it
+                    entry = None
+
+            new_entry = None
+            if entry is not None and entry.get('refresh_token') is not None:
+                try:
+                    new_entry = self.requestToken(session,
+                                                  entry['auth_endpoint'],
+                                                  {'grant_type': 'refresh_token', 'refresh_token': entry['refresh_token']})
+                except Exception:
+                    # the refresh token was revoked or has expired; mint a new token instead
+                    new_entry = None
+            if new_entry is None:
+                response = session.get(api_base_url.format('/info'))
+                if response.status_code != 200:
+                    raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))
+                auth_endpoint = response.json()['authorization_endpoint'] + '/oauth/token'
+                new_entry = self.requestToken(session,
+                                              auth_endpoint,
+                                              {'grant_type': 'password', 'username': id, 'password': password})
+                new_entry['secret_salt'] = binascii.hexlify(os.urandom(16)).decode('ascii')
+                new_entry['secret_hash'] = self.hashSecret(password, new_entry['secret_salt'])
+            else:
+                new_entry['secret_salt'] = entry['secret_salt']
+                new_entry['secret_hash'] = entry['secret_hash']
+
+            with self.lock:
+                self.tokens[key] = new_entry
+                self.save()
+            return new_entry['token_type'] + ' ' + new_entry['access_token']
+
+    def requestToken(self, session, auth_endpoint, data):
+        """
+        Request an access token from the UAA token endpoint using the specified grant
+        """
+        headers = {
+            'accept': 'application/json',
+            'content-type': 'application/x-www-form-urlencoded;charset=utf-8'
+        }
+        response = session.post(auth_endpoint, data=data, headers=headers, auth=('cf', ''))
+        if response.status_code == 200:
+            results = response.json()
+            return {
+                'auth_endpoint': auth_endpoint,
+                'token_type': results['token_type'],
+                'access_token': results['access_token'],
+                'refresh_token': results.get('refresh_token'),
+                'expires_at': time.time() + int(results.get('expires_in', 0))
+            }
+        else:
+            raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))
+
+    def invalidate(self, api_base_url, id, password):
+        """
+        Mark the cached access token for the specified endpoint and user as expired (e.g. after it was rejected).
+        The refresh token is retained.
+        """
+        with self.lock:
+            entry = self.tokens.get(self.getKey(api_base_url, id, password))
+            if entry is not None:
+                entry['expires_at'] = 0
+                self.save()
+
+    def load(self):
+        """
+        Load persisted tokens from the cache file, if one was configured
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as cache_file:
+                self.tokens.update(json.load(cache_file))
+        except Exception as ex:
+            print(' Warning. Ignoring token cache file "{}": {}'.format(self.cache_file, ex))
+
+    def save(self):
+        """
+        Persist tokens in the cache file, if one was configured. The file is only readable by the current user.
+        """
+        if self.cache_file is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        temp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(self.tokens, cache_file)
+        # atomically replace the previous version
+        getattr(os, 'replace', os.rename)(temp_file, self.cache_file)
+
+# tokens are shared by all clients in this process (e.g. multiple Browser instances in a notebook)
+default_token_manager = TokenManager()
+
+token_managers = {}
+token_managers_lock = threading.Lock()
+
+def getTokenManager(cache_file=None):
+    """
+    Return the token manager that is shared by all clients in this process that use the specified cache file
+    """
+    if cache_file is None:
+        return default_token_manager
+    cache_file = os.path.abspath(os.path.expanduser(cache_file))
+    with token_managers_lock:
+        if cache_file not in token_managers:
+            token_managers[cache_file] = TokenManager(cache_file=cache_file)
+        return token_managers[cache_file]
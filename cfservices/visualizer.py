@@ -15,7 +15,13 @@
 # -------------------------------------------------------------------------------
 from pixiedust.display.app import *
 import json
-import requests
+import time
+
+from .client import Client
+from .collector import Collector
+from .credentials import CredentialsCache
+from .filters import FilterIndex, ServiceInstanceFilter
+from .frames import fillna
 
 @PixieApp
 @Logger()
@@ -32,56 +38,57 @@ class Visualizer():
         if self.services_df is None:
             raise Exception("You must specify a Pandas DataFrame: {'data': <populated DataFrame>}")
 
-        # in case any service name lookups or service plan name lookups failed, replace None with a descriptive meta string 
-        self.services_df = self.services_df.fillna(value={'service_plan_name':'[UNKNOWN/DISCONTINUED]', 'service_name':'[UNKNOWN/DISCONTINUED]'})
-        
-        # pre-compute service type list
-        self.service_types_df = self.services_df[['service_guid', 'service_name']].drop_duplicates().sort_values(by=['service_name'])
-        
-        self.cloud_config = {}
+        # the service instance information is optionally collected again in the background (see InventoryRefresher)
+        self.refresher = self.pixieapp_entity.get('refresher', None)
+        self.updated_at = self.refresher.updated_at if self.refresher is not None else time.time()
 
-        self.cloud_config['api_base_url'] = self.pixieapp_entity.get('api_base_url', 'https://api.ng.bluemix.net{}')
+        # reuse the caller's client (connection pool and access token) if one was provided
+        # if the DataFrame contains a region and/or identity column, a dictionary of clients keyed by
+        # region, identity or (region, identity) must be provided (see get_client_key)
+        self.clients = self.pixieapp_entity.get('clients', None)
+        self.client = self.pixieapp_entity.get('client', None)
+        if self.clients is None and self.client is None:
+            api_base_url = self.pixieapp_entity.get('api_base_url', 'https://api.ng.bluemix.net{}')
 
-        if self.pixieapp_entity.get('api_token', None) is None:
-        	self.cloud_config['ibmid'] = self.pixieapp_entity.get('ibmid', None)
-        	self.cloud_config['password'] = self.pixieapp_entity.get('password', None)
-        else:	
-        	self.cloud_config['ibmid'] = 'apikey'
-        	self.cloud_config['password'] = self.pixieapp_entity.get('api_token')
-        
-        if self.cloud_config['ibmid'] is None or self.cloud_config['password'] is None:
-           raise Exception("You must specify an IBM Cloud user api_token {'api_token': '<token>'} or an {'ibmid': '<ibmid>',  'password': '<password>'}")
-
-        self.cloud_config['credentials'] = None
-
-
-        response = requests.get(self.cloud_config['api_base_url'].format('/info'))
-        if response.status_code == 200:
-              auth_endpoint = response.json()['authorization_endpoint'] + '/oauth/token'
-              data = 'grant_type=password&username={0}&password={1}'.format(self.cloud_config['ibmid'], self.cloud_config['password'])
-              headers = {
-                'accept': 'application/json',
-                'content-type': 'application/x-www-form-urlencoded;charset=utf-8'
-              }
-              response = requests.post(auth_endpoint, data=data, headers=headers, auth=('cf', ''))
-              if response.status_code == 200:
-                 results = response.json()
-                 self.cloud_config['credentials'] = results['token_type'] + ' ' + results['access_token']
-              else:
-                 raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))
-        else:
-           raise Exception('Fatal error obtaining auth token. IBM Cloud returned {}.'.format(response))   
+            if self.pixieapp_entity.get('api_token', None) is None and (self.pixieapp_entity.get('ibmid', None) is None or self.pixieapp_entity.get('password', None) is None):
+               raise Exception("You must specify an IBM Cloud user api_token {'api_token': '<token>'} or an {'ibmid': '<ibmid>',  'password': '<password>'}")
+
+            self.client = Client(ibm_cloud_user_api_token = self.pixieapp_entity.get('api_token', None),
+                                 ibmid = self.pixieapp_entity.get('ibmid', None),
+                                 password = self.pixieapp_entity.get('password', None),
+                                 api_base_url = api_base_url)
 
-        # holds current filter selections
+        if self.clients is None:
+            self.clients = {None: self.client}
+        self.client_columns = [column for column in ['region', 'identity'] if column in self.services_df.columns]
+
+        # service keys are cached for credentials_ttl seconds and optionally prefetched for all matching service instances
+        self.credentials_caches = dict((key, CredentialsCache(client, ttl = self.pixieapp_entity.get('credentials_ttl', 300)))
+                                       for key, client in self.clients.items())
+        self.prefetch_credentials = self.pixieapp_entity.get('prefetch_credentials', False)
+        self.prefetch_filter = None     # filter selections whose matching service instances were prefetched
+
+        # holds current filter selections and the visible part of the (sorted) service instance list
         self.state = {
             'filter': {
                 'service_guid': None,
                 'service_plan_name': None,
                 'org_guid': None,
                 'space_guid': None
+            },
+            'list': {
+                'offset': 0,
+                'page_size': int(self.pixieapp_entity.get('page_size', 100)),
+                'sort_by': 'service_instance_name'
             }
         }
 
+        self.set_inventory(self.get_inventory(self.services_df))
+
+        if self.refresher is not None:
+            # new results are prepared on the refresher's worker thread and swapped in by display_refresh_status
+            self.refresher.start(prepare = self.get_inventory)
+
 
     
     @route()
@@ -93,9 +100,6 @@ class Visualizer():
         
         self.debug("Entering method main screen")
         
-        # mark all service instances visible by default. filters will override this setting
-        self.services_df['hide_service_instance'] = False
-        
         return """
             <!-- custom styling -->
             <style>
@@ -109,6 +113,17 @@ class Visualizer():
                 td { text-align: left; }
             </style>
 
+            {% if this.refresher is not none %}
+            <!-- last updated timestamp and refresh control -->
+            <div id="refresh_status{{prefix}}"
+                 pd_target="refresh_status{{prefix}}"
+                 pd_options="op=display_refresh_status"
+                 pd_render_onload
+                 pd_refresh_rate="5000"
+                 class="no_loading_msg">
+            </div>
+            {% endif %}
+
             <!-- filters -->
             <div class="outer-wrapper" 
                  id="filters{{prefix}}"
@@ -147,35 +162,26 @@ class Visualizer():
                                                                         self.state['filter']['service_plan_name'],
                                                                         self.state['filter']['org_guid'],
                                                                         self.state['filter']['space_guid']))
-        # helpers: temporarily store filter options 
-        service_filter_options = {}
-        service_plan_filter_options = {}
-        org_filter_options = {}
-        space_filter_options = {}
-    
-        for index, row in self.services_df.iterrows():
-            service_filter_options[row['service_guid']] = row['service_name']
-            if self.state['filter']['service_guid'] is None or self.state['filter']['service_guid'] == row['service_guid']:                
-                service_plan_filter_options[row['service_plan_name']] = row['service_plan_name'] 
-                if self.state['filter']['service_plan_name'] is None or self.state['filter']['service_plan_name'] == row['service_plan_name']:                
-                    org_filter_options[row['org_guid']] = row['org_name']
-                    if self.state['filter']['org_guid'] is None or self.state['filter']['org_guid'] == row['org_guid']:                    
-                        space_filter_options[row['space_guid']] = row['space_name']                
-
-        # sort filter options using the display name (case-insentitive)
-        sorted_service_filter_options_keys = sorted(service_filter_options, key=lambda k: service_filter_options.get(k,'').lower())
-        sorted_service_plan_filter_options_keys = sorted(service_plan_filter_options, key=lambda k: service_plan_filter_options.get(k,'').lower())
-        sorted_org_filter_options_keys = sorted(org_filter_options, key=lambda k: org_filter_options.get(k,'').lower())
-        sorted_space_filter_options_keys = sorted(space_filter_options, key=lambda k: space_filter_options.get(k,'').lower())
-        
+        # look up filter options (sorted by display name) in the pre-computed index
+        service_filter = self.state['filter']['service_guid']
+        service_plan_filter = self.state['filter']['service_plan_name']
+        org_filter = self.state['filter']['org_guid']
+
+        service_filter_options = self.filter_index.service_names
+        service_plan_filter_options = self.filter_index.service_plan_names
+        org_filter_options = self.filter_index.org_names
+        space_filter_options = self.filter_index.space_names
+
+        sorted_service_filter_options_keys = self.filter_index.getServiceOptions()
+        sorted_service_plan_filter_options_keys = self.filter_index.getServicePlanOptions(service_filter)
+        sorted_org_filter_options_keys = self.filter_index.getOrgOptions(service_filter, service_plan_filter)
+        sorted_space_filter_options_keys = self.filter_index.getSpaceOptions(service_filter, service_plan_filter, org_filter)
+
         # debug
-        self.info('Service plan filter options: {}'.format(service_plan_filter_options))
-        self.info('Sorted service plan filter option keys: {}'.format(sorted_service_plan_filter_options_keys))
-        self.info('Org filter options: {}'.format(org_filter_options))
-        self.info('Sorted org filter option keys: {}'.format(sorted_org_filter_options_keys))
-        self.info('Space filter options: {}'.format(space_filter_options))
-        self.info('Sorted space filter option keys: {}'.format(sorted_space_filter_options_keys))
-        
+        self.debug('Sorted service plan filter option keys: {}'.format(sorted_service_plan_filter_options_keys))
+        self.debug('Sorted org filter option keys: {}'.format(sorted_org_filter_options_keys))
+        self.debug('Sorted space filter option keys: {}'.format(sorted_space_filter_options_keys))
+
         # render context-sensitive filters
         return  """
             <select id="service_guid_filter{{prefix}}"
@@ -236,6 +242,40 @@ class Visualizer():
             </select>        
         """
    
+    @route(op="display_refresh_status")
+    @templateArgs
+    def display_refresh_status(self):
+        """
+        This PixieApp route swaps in the service instance information that was collected in the background (if any)
+        and displays when it was last updated. The filters and the service instance list are re-rendered after a swap.
+        """
+
+        update = self.refresher.getUpdate()
+        if update is not None:
+            self.info("Swapping in service instance information collected at {}".format(time.ctime(update['updated_at'])))
+            self.set_inventory(update['prepared'] or self.get_inventory(update['data']))
+            self.updated_at = update['updated_at']
+
+        last_updated = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.updated_at))
+        service_count = len(self.services_df)
+        refreshing = self.refresher.refreshing
+        error = self.refresher.error
+
+        return  """
+         <div>
+         Last updated {{last_updated}} ({{service_count}} service instances)
+         <button class="btn btn-default btn-sm" type="button"
+                 {% if refreshing %}disabled{% endif %}
+                 pd_script="self.refresh_inventory()"
+                 pd_refresh="refresh_status{{prefix}}">{% if refreshing %}Refreshing...{% else %}Refresh{% endif %}</button>
+         {% if error %}<span>The last refresh failed: {{error}}</span>{% endif %}
+         </div>
+         {% if update is not none %}
+         <div pd_options="op=display_filters" pd_target="filters{{prefix}}" pd_render_onload class="no_loading_msg"></div>
+         <div pd_options="op=display_service_list" pd_target="matching_service_list{{prefix}}" pd_render_onload class="no_loading_msg"></div>
+         {% endif %}
+        """
+
     @route(op="display_service_list")
     @templateArgs
     def display_service_list(self):
@@ -248,63 +288,93 @@ class Visualizer():
                                                                       self.state['filter']['org_guid'],
                                                                       self.state['filter']['space_guid']))
             
-        # define filter function
-        def filter_df(r, service_guid = None, service_plan_name = None, org_guid = None, space_guid = None):
-            """ Return True if this row should be hidden
-            """
-            if service_guid is not None and service_guid != r['service_guid']:
-                return True
-            if service_plan_name is not None and service_plan_name != r['service_plan_name']:
-                return True
-            if org_guid is not None and org_guid != r['org_guid']:
-                return True
-            if space_guid is not None and space_guid != r['space_guid']:
-                return True
-            return False
-        
-        # apply filter function on DataFrame, setting field hide_service_instance to True or False for each row, as appropriate
-        self.services_df['hide_service_instance'] = self.services_df.apply(filter_df, 
-                                                                           axis = 1, 
-                                                                           service_guid = self.state['filter']['service_guid'], 
-                                                                           service_plan_name = self.state['filter']['service_plan_name'], 
-                                                                           org_guid = self.state['filter']['org_guid'], 
-                                                                           space_guid = self.state['filter']['space_guid'])
+        # look up the service instances that match the current filters (sorted by the selected column)
+        matching_services_df = self.service_filter.getMatches(service_guid = self.state['filter']['service_guid'],
+                                                              service_plan_name = self.state['filter']['service_plan_name'],
+                                                              org_guid = self.state['filter']['org_guid'],
+                                                              space_guid = self.state['filter']['space_guid'],
+                                                              sort_by = self.state['list']['sort_by'])
+
+        # retrieve the credentials of the matching service instances in the background (once per filter selection)
+        prefetch_filter = tuple(sorted(self.state['filter'].items()))
+        if self.prefetch_credentials and prefetch_filter != self.prefetch_filter:
+            if len(self.client_columns) == 0:
+                groups = [(None, matching_services_df['service_instance_guid'])]
+            else:
+                groups = matching_services_df.groupby(self.client_columns, sort=False, observed=True)['service_instance_guid']
+            started = True
+            for key, guids in groups:
+                if isinstance(key, tuple) and len(key) == 1:
+                    key = key[0]
+                started = self.credentials_caches[key].prefetch(guids.values) and started
+            if started:
+                self.prefetch_filter = prefetch_filter
+        # prefetches run in the background; their errors are shown with the next list
+        prefetch_errors = [cache.prefetch_error for cache in self.credentials_caches.values() if cache.prefetch_error is not None]
+        prefetch_error = prefetch_errors[0] if len(prefetch_errors) > 0 else None
+
+        # only render the current page
+        page_size = self.state['list']['page_size']
+        match_count = len(matching_services_df)
+        offset = min(self.state['list']['offset'], max(0, (match_count - 1) // page_size * page_size))
+        self.state['list']['offset'] = offset
+        page_df = matching_services_df.iloc[offset:offset + page_size]
 
         # compose list summary message: "Showing X of Y service instances"
-        stats = self.services_df.groupby(by='hide_service_instance').size().values
-        if len(stats) == 1:
-            count_msg = 'Showing {} of {} service instances'.format(stats[0], stats[0])
+        count_msg = 'Showing {} of {} service instances'.format(match_count, len(self.services_df))
+        if match_count > page_size:
+            page_msg = '{} - {}'.format(offset + 1, offset + len(page_df))
+            previous_offset = max(0, offset - page_size) if offset > 0 else None
+            next_offset = offset + page_size if offset + page_size < match_count else None
         else:
-            count_msg = 'Showing {} of {} service instances'.format(stats[0], stats[0] + stats[1])
-        
-        # render list of services that are not marked as hidden
+            page_msg = None
+            previous_offset = None
+            next_offset = None
+
+        sort_columns = [('service_instance_name', 'Service Instance Name'),
+                        ('service_name', 'Service Name'),
+                        ('service_plan_name', 'Service Plan'),
+                        ('org_name', 'Organization'),
+                        ('space_name', 'Space')]
+        sort_columns.extend([(column, column.capitalize()) for column in self.client_columns])
+
+        # render list of matching services
         return  """
          <div>
          {{count_msg}}
+         {% if page_msg %}
+           ({{page_msg}})
+           <button class="btn btn-default btn-sm" type="button"
+                   {% if previous_offset is none %}disabled{% endif %}
+                   pd_script="self.set_service_list_offset({{previous_offset}})"
+                   pd_refresh="matching_service_list{{prefix}}">Previous</button>
+           <button class="btn btn-default btn-sm" type="button"
+                   {% if next_offset is none %}disabled{% endif %}
+                   pd_script="self.set_service_list_offset({{next_offset}})"
+                   pd_refresh="matching_service_list{{prefix}}">Next</button>
+         {% endif %}
+         {% if prefetch_error %}<span>Credentials could not be prefetched: {{prefetch_error}}</span>{% endif %}
          </div>
          <table class="table">
            <thead>
              <tr>
-                <th>Service Instance Name</th>
-                <th>Service Name</th>
-                <th>Service Plan</th>
-                <th>Organization</th>
-                <th>Space</th>
+             {% for sort_column, sort_label in sort_columns %}
+                <th><button class="btn btn-link" type="button" pd_script="self.set_service_list_sort_column('{{sort_column}}')" pd_refresh="matching_service_list{{prefix}}">{{sort_label}}</button>{% if this['state']['list']['sort_by'] == sort_column %} &#9650;{% endif %}</th>
+             {% endfor %}
                 <th>Actions</th>
              </tr>
           </thead>
           <tbody>
-          {% for row in this.services_df.sort_values(by=['service_instance_name']).itertuples()%}
-           {% if row['hide_service_instance'] == False %}
+          {% for row in page_df.itertuples()%}
             <tr>
                 <td>{{row['service_instance_name']}}</td>
                 <td>{{row['service_name']}}</td>
                 <td>{{row['service_plan_name']}}</td>
                 <td>{{row['org_name']}}</td>
                 <td>{{row['space_name']}}</td>
+                {% for column in this.client_columns %}<td>{{row[column]}}</td>{% endfor %}
                 <td><button class="btn btn-default" type="button" pd_options="service_instance_guid={{row['service_instance_guid']}}" pd_target="credentials_list{{prefix}}">View credentials</button></td>
             </tr>
-           {% endif %}
           {% endfor %}
           </tbody>
          </table>
@@ -325,41 +395,40 @@ class Visualizer():
         
         self.debug("Entering method list_credentials: {}".format(service_instance_guid))
                
+        svc_instance_metadata = self.services_df[self.services_df['service_instance_guid'] == service_instance_guid].iloc[0]
+        instance_info = 'service instance "{}" in org "{}" space "{}"'.format(svc_instance_metadata.get('service_instance_name'),
+                                                                              svc_instance_metadata.get('org_name'),
+                                                                              svc_instance_metadata.get('space_name'))
+
         # result data structure
         service_instance_credentials = []
         
-        http_headers = {
-           'accept':'application/json',
-           'content-type':'application/json',
-           'authorization':self.cloud_config['credentials'] 
-        }
-        
-        # https://apidocs.cloudfoundry.org/245/service_instances/list_all_service_keys_for_the_service_instance.html
-        url = '/v2/service_instances/{}/service_keys'.format(service_instance_guid)  
-        while url is not None:
-            self.debug('Loading service instance credentials...') 
-            response = requests.get(self.cloud_config['api_base_url'].format(url), headers=http_headers)
-            if response.status_code == 200:
-                for resource in response.json().get('resources', []):
-                    service_instance_credentials.append({"name":resource['entity']['name'] , 
-                                                         "credentials": resource['entity']['credentials'],
-                                                         "formatted_credentials": json.dumps(resource['entity']['credentials'], indent=4)})     
-                url = response.json()['next_url']                
-            else:
-                self.info('Fatal error retrieving service key information: {}'.format(response))
-                url = None
+        self.debug('Loading service instance credentials...')
+        service_keys = []
+        for client_key in self.get_client_keys(svc_instance_metadata):
+            try:
+                service_keys = self.credentials_caches[client_key].get(service_instance_guid)
+            except Exception as ex:
+                # e.g. the identity can see the service instance (space auditor), but cannot read its service keys
+                self.info('Error retrieving service key information using {}: {}'.format(client_key, ex))
+                continue
+            if len(service_keys) > 0:
+                break
+        for service_key in service_keys:
+            service_instance_credentials.append({"name": service_key['name'],
+                                                 "credentials": service_key['credentials'],
+                                                 "formatted_credentials": json.dumps(service_key['credentials'], indent=4)})
  
         # Debug: display credentials
         self.debug(service_instance_credentials)        
         
-        svc_instance_metadata = self.services_df[self.services_df['service_instance_guid'] == service_instance_guid].iloc[0]
-        instance_info = 'service instance "{}" in org "{}" space "{}"'.format(svc_instance_metadata.get('service_instance_name'),
-                                                                              svc_instance_metadata.get('org_name'),
-                                                                              svc_instance_metadata.get('space_name'))
-        
         if len(service_instance_credentials) == 0:
             return """
             <h3>There are no credentials defined for {{instance_info}}</h3>
+            <button class="btn btn-default btn-sm" type="button"
+                    pd_script="self.invalidate_credentials('{{service_instance_guid}}')"
+                    pd_options="service_instance_guid={{service_instance_guid}}"
+                    pd_target="credentials_list{{prefix}}">Reload</button>
             """
         else:     
                      
@@ -368,6 +437,10 @@ class Visualizer():
               
               <div>
               <h2>Credentials for {{instance_info}}</h2>
+              <button class="btn btn-default btn-sm" type="button"
+                      pd_script="self.invalidate_credentials('{{service_instance_guid}}')"
+                      pd_options="service_instance_guid={{service_instance_guid}}"
+                      pd_target="credentials_list{{prefix}}">Reload</button>
               <ul class="list-group">
               {% for credential in service_instance_credentials %}
                 
@@ -404,6 +477,7 @@ get_ipython().set_next_input("# @hidden_cell\\n# {}\\n{}={}".format('{{instance_
             'org_guid': None,
             'space_guid': None
         }
+        self.state['list']['offset'] = 0
         return
     
     def reset_selected_service_plan_filter(self, service_plan_name=None):
@@ -419,6 +493,7 @@ get_ipython().set_next_input("# @hidden_cell\\n# {}\\n{}={}".format('{{instance_
         self.state['filter']['service_plan_name'] = service_plan_name
         self.state['filter']['org_guid'] = None
         self.state['filter']['space_guid'] = None
+        self.state['list']['offset'] = 0
         return
   
     def reset_selected_org_guid_filter(self, org_guid=None):
@@ -433,6 +508,7 @@ get_ipython().set_next_input("# @hidden_cell\\n# {}\\n{}={}".format('{{instance_
         
         self.state['filter']['org_guid'] = org_guid
         self.state['filter']['space_guid'] = None
+        self.state['list']['offset'] = 0
         return
 
     def reset_selected_space_guid_filter(self, space_guid=None):
@@ -446,6 +522,111 @@ get_ipython().set_next_input("# @hidden_cell\\n# {}\\n{}={}".format('{{instance_
             space_guid = None
             
         self.state['filter']['space_guid'] = space_guid
-        return    
-    
-    
\ No newline at end of file
+        self.state['list']['offset'] = 0
+        return
+
+    def refresh_inventory(self):
+        """
+        Helper: collect the service instance information again in the background
+        """
+        self.info("Refreshing service instance information")
+        self.refresher.refresh()
+        return
+
+    def get_inventory(self, services_df):
+        """
+        Helper: return the service instance DataFrame and the pre-computed lookup structures that the routes use
+        (may be called on a worker thread)
+        """
+        # e.g. an empty DataFrame without columns
+        missing_columns = [column for column in Collector.SERVICE_INSTANCE_COLUMNS if column not in services_df.columns]
+        if missing_columns:
+            services_df = services_df.reindex(columns=list(services_df.columns) + missing_columns)
+
+        # in case any service name lookups or service plan name lookups failed, replace None with a descriptive meta string
+        services_df = fillna(services_df, value={'service_plan_name':'[UNKNOWN/DISCONTINUED]', 'service_name':'[UNKNOWN/DISCONTINUED]'})
+
+        return {
+            'services_df': services_df,
+            # pre-compute service type list
+            'service_types_df': services_df[['service_guid', 'service_name']].drop_duplicates().sort_values(by=['service_name']),
+            # pre-compute the options of the service, service plan, organization and space filters
+            'filter_index': FilterIndex(services_df),
+            # pre-sort the service instance list and cache the results of recently used filters
+            'service_filter': ServiceInstanceFilter(services_df)
+        }
+
+    def set_inventory(self, inventory):
+        """
+        Helper: replace the service instance DataFrame and its lookup structures (see get_inventory), keeping the
+        filter selections that are still valid
+        """
+        self.services_df = inventory['services_df']
+        self.service_types_df = inventory['service_types_df']
+        self.filter_index = inventory['filter_index']
+        self.service_filter = inventory['service_filter']
+        self.prefetch_filter = None
+
+        selections = [('service_guid', self.filter_index.service_names),
+                      ('service_plan_name', self.filter_index.service_plan_names),
+                      ('org_guid', self.filter_index.org_names),
+                      ('space_guid', self.filter_index.space_names)]
+        for name, options in selections:
+            if self.state['filter'][name] is not None and self.state['filter'][name] not in options:
+                self.info("Resetting {} filter: {} is no longer available".format(name, self.state['filter'][name]))
+                self.state['filter'][name] = None
+        return
+
+    def set_service_list_offset(self, offset=0):
+        """
+        Helper: display the page of the service instance list that starts at the specified offset
+        """
+        self.state['list']['offset'] = max(0, int(offset))
+        return
+
+    def set_service_list_sort_column(self, sort_by='service_instance_name'):
+        """
+        Helper: sort the service instance list by the specified column and display the first page
+        """
+        self.info("Sorting service instance list by {}".format(sort_by))
+
+        if sort_by not in ['service_instance_name', 'service_name', 'service_plan_name', 'org_name', 'space_name', 'region', 'identity']:
+            sort_by = 'service_instance_name'
+
+        self.state['list']['sort_by'] = sort_by
+        self.state['list']['offset'] = 0
+        return
+
+    def invalidate_credentials(self, service_instance_guid=None):
+        """
+        Helper: discard the cached credentials of the specified service instance
+        """
+        self.info("Discarding cached credentials of {}".format(service_instance_guid))
+        svc_instance_metadata = self.services_df[self.services_df['service_instance_guid'] == service_instance_guid].iloc[0]
+        for client_key in self.get_client_keys(svc_instance_metadata):
+            self.credentials_caches[client_key].invalidate(service_instance_guid)
+        return
+
+    def get_client_key(self, svc_instance_metadata):
+        """
+        Helper: return the key of the client (and credentials cache) that can access the specified service instance
+        """
+        key = tuple(svc_instance_metadata[column] for column in self.client_columns)
+        if len(key) == 0:
+            return None
+        return key[0] if len(key) == 1 else key
+
+    def get_client_keys(self, svc_instance_metadata):
+        """
+        Helper: return the keys of the clients that might be able to read the service keys of the specified service
+        instance: the client of its row, followed by the clients of the other identities (in the same region)
+        """
+        key = self.get_client_key(svc_instance_metadata)
+        if 'identity' not in self.client_columns:
+            return [key]
+        identity_index = self.client_columns.index('identity')
+        as_tuple = lambda client_key: client_key if isinstance(client_key, tuple) else (client_key,)
+        others = [client_key for client_key in self.credentials_caches.keys()
+                  if client_key != key and all(value == as_tuple(key)[index]
+                                               for index, value in enumerate(as_tuple(client_key)) if index != identity_index)]
+        return [key] + others
@@ -3,11 +3,20 @@ setup(name='cfservices',
 	  version='0.1.0',
 	  description='IBM Cloud services credential browser',
 	  url='https://github.com/ibm-watson-data-lab/cf-service-credential-browser',
-	  install_requires=['pixiedust >= 1.1.9', 'pandas','requests'],
+	  install_requires=['pandas','requests','futures; python_version < "3.2"'],
+	  extras_require={
+	   'notebook': ['pixiedust >= 1.1.9'],
+	   'async': ['aiohttp'],
+	   'parquet': ['pyarrow'],
+	   'speedups': ['orjson', 'ijson']
+	  },
 	  author='Patrick Titzler',
 	  author_email='ptitzler@us.ibm.com',
 	  license='Apache 2.0',
 	  packages=find_packages(),
+	  entry_points={
+	   'console_scripts': ['cfservices = cfservices.cli:main']
+	  },
 	  include_package_data=False,
 	  zip_safe=False,
 	  classifiers=[